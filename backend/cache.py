@@ -0,0 +1,112 @@
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize free text so trivially different phrasings share a cache key"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = _PUNCTUATION_RE.sub(" ", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def make_objection_key(
+    objection_text: str, language: Optional[str], scenario_id: Optional[int], prompt_version: str = ""
+) -> str:
+    """Build the cache key for an objection request (``prompt_version`` retires replies to older prompts)"""
+    raw = "|".join([
+        normalize_text(objection_text),
+        normalize_text(language or "English"),
+        str(scenario_id or 0),
+        prompt_version,
+    ])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def make_scenario_key(scenario_id: int, language: Optional[str], prompt_version: str = "") -> str:
+    """Build the cache key for an objection answered as a curated scenario, whatever its phrasing"""
+    raw = "|".join(["scenario", str(scenario_id), normalize_text(language or "English"), prompt_version])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """In-memory LRU cache with TTL and an optional shared second tier.
+
+    The memory tier is bounded by ``max_entries``; the least recently used entry
+    is evicted first. When ``store`` is given (a key-value namespace of a
+    ``shared`` state backend), entries are written through to it so every worker
+    sees them and warm responses survive restarts, and memory misses fall back to
+    it. Store errors are logged and treated as misses, never raised.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 3600, store=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def ensure_indexes(self):
+        if self.store is not None:
+            await self.store.ensure_indexes()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.expirations += 1
+
+        value = await self.store.get(key) if self.store is not None else None
+        if value is not None:
+            self.hits += 1
+            self.shared_hits += 1
+            self._store(key, value)
+            return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        self._store(key, value)
+        if self.store is not None:
+            await self.store.set(key, value, self.ttl_seconds)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_hits": self.shared_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "shared": self.store is not None,
+        }
+
+    def _store(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
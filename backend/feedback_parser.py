@@ -0,0 +1,153 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field, ValidationError
+
+
+class FeedbackReply(BaseModel):
+    """What the feedback model is asked to return, as a single JSON object"""
+    score: int = Field(..., ge=1, le=10)
+    strengths: List[str] = Field(default_factory=list, max_length=3)
+    suggestions: List[str] = Field(..., min_length=1, max_length=3)
+
+
+# Embedded in the system message so the model sees the exact contract
+FEEDBACK_JSON_CONTRACT = (
+    'Reply with ONLY a JSON object, no prose or code fences: '
+    '{"score": <integer 1-10>, "strengths": [<1-2 short strings>], "suggestions": [<2-3 short strings>]}'
+)
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_SCORE_FIELD_RE = re.compile(r'"score"\s*:\s*(\d{1,2})\b')
+_LIST_FIELD_RES = {
+    name: re.compile(rf'"{name}"\s*:\s*(\[(?:[^\[\]"]|"(?:[^"\\]|\\.)*")*\])', re.DOTALL)
+    for name in ("strengths", "suggestions")
+}
+
+# Fallback for replies that ignore the JSON contract and use the markdown layout
+_MARKDOWN_SCORE_RE = re.compile(r"score[^0-9\n]{0,10}(\d{1,2})\s*(?:/\s*10)?|(\d{1,2})\s*/\s*10", re.IGNORECASE)
+_MARKDOWN_SECTION_RE = re.compile(r"(?:improve|suggestions?)\s*\**\s*:", re.IGNORECASE)
+_MARKDOWN_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*\S)")
+
+
+class FeedbackParseError(ValueError):
+    pass
+
+
+class FeedbackStreamParser:
+    """Incremental parser for the JSON feedback contract.
+
+    ``feed`` accepts the reply in chunks and returns any fields that became
+    available with that chunk (``score`` as soon as its digits are complete,
+    ``strengths`` and ``suggestions`` once their arrays close), so callers can
+    surface them before the object ends. ``finish`` validates the whole reply
+    against FeedbackReply.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self.score: Optional[int] = None
+        self.strengths: Optional[List[str]] = None
+        self.suggestions: Optional[List[str]] = None
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        self._buffer += chunk
+        found: Dict[str, Any] = {}
+        if self.score is None:
+            match = _SCORE_FIELD_RE.search(self._buffer)
+            # Digits at the very end of the buffer may still be growing
+            if match and match.end() < len(self._buffer):
+                score = int(match.group(1))
+                if 1 <= score <= 10:
+                    self.score = found["score"] = score
+        for name, pattern in _LIST_FIELD_RES.items():
+            if getattr(self, name) is not None:
+                continue
+            match = pattern.search(self._buffer)
+            if match:
+                try:
+                    items = json.loads(match.group(1))
+                except ValueError:
+                    items = None
+                if isinstance(items, list) and all(isinstance(item, str) for item in items):
+                    setattr(self, name, items)
+                    found[name] = items
+        return found
+
+    def rendered(self) -> str:
+        """The start of ``render_feedback``'s markdown that the fields parsed so far fix"""
+        return render_feedback_prefix(self.score, self.strengths, self.suggestions)
+
+    def finish(self) -> FeedbackReply:
+        text = _FENCE_RE.sub("", self._buffer.strip())
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end < start:
+            raise FeedbackParseError("reply does not contain a JSON object")
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError as e:
+            raise FeedbackParseError(f"invalid JSON: {e}")
+        try:
+            return FeedbackReply.model_validate(data)
+        except ValidationError as e:
+            problems = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'reply'}: {err['msg']}" for err in e.errors())
+            raise FeedbackParseError(problems)
+
+
+def parse_feedback_reply(text: str) -> FeedbackReply:
+    parser = FeedbackStreamParser()
+    parser.feed(text)
+    return parser.finish()
+
+
+def repair_prompt(original_prompt: str, reply: str, error: FeedbackParseError) -> str:
+    """Follow-up prompt asking the model to fix a reply that failed validation"""
+    return (
+        f"{original_prompt}\n\n"
+        f"Your previous reply was:\n{reply}\n\n"
+        f"It was rejected because: {error}\n"
+        f"{FEEDBACK_JSON_CONTRACT}"
+    )
+
+
+def render_feedback(reply: FeedbackReply) -> str:
+    """Markdown feedback in the layout the frontend renders"""
+    return render_feedback_prefix(reply.score, reply.strengths, reply.suggestions)
+
+
+def render_feedback_prefix(
+    score: Optional[int], strengths: Optional[List[str]], suggestions: Optional[List[str]]
+) -> str:
+    """``render_feedback`` up to the first field not known yet (None), so it only ever grows"""
+    if score is None:
+        return ""
+    lines = [f"**Score:** {score}/10"]
+    if strengths is None:
+        return "\n".join(lines)
+    if strengths:
+        lines.append(f"**What worked:** {' '.join(strengths)}")
+    if suggestions is None:
+        return "\n".join(lines)
+    lines.append("**Improve:**")
+    lines.extend(f"- {suggestion}" for suggestion in suggestions)
+    return "\n".join(lines)
+
+
+def parse_markdown_feedback(text: str) -> Tuple[Optional[int], List[str]]:
+    """Best-effort (score, suggestions) from a free-form markdown reply"""
+    score = None
+    match = _MARKDOWN_SCORE_RE.search(text)
+    if match:
+        value = int(match.group(1) or match.group(2))
+        if 1 <= value <= 10:
+            score = value
+
+    suggestions: List[str] = []
+    section = _MARKDOWN_SECTION_RE.search(text)
+    if section:
+        for line in text[section.end():].splitlines():
+            bullet = _MARKDOWN_BULLET_RE.match(line)
+            if bullet:
+                suggestions.append(bullet.group(1).strip("* "))
+    return score, suggestions[:3]
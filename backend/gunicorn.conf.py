@@ -0,0 +1,18 @@
+"""Multi-worker serving: ``gunicorn -c gunicorn.conf.py server:app`` (from backend/).
+
+Each worker is a separate process running the app's lifespan (scenario catalog,
+indexes, write-behind flusher). Cache entries and the LLM rate limit are shared
+through ``SHARED_STATE_BACKEND=mongo``; per-process limits such as
+``LLM_MAX_CONCURRENCY`` apply to each worker. See README.md.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Streamed AI replies can take as long as LLM_CALL_TIMEOUT plus retries
+timeout = int(os.environ.get("WORKER_TIMEOUT", "180"))
+graceful_timeout = int(os.environ.get("WORKER_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
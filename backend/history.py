@@ -0,0 +1,222 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+# Per-document write errors worth retrying (conflicts, failovers, shutdowns, timeouts); others are permanent
+RETRYABLE_WRITE_CODES = {6, 7, 50, 89, 91, 112, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "week": "%G-W%V",
+    "month": "%Y-%m",
+}
+
+
+def _round_scores(rows: List[dict]) -> List[dict]:
+    for row in rows:
+        if row.get("avg_score") is not None:
+            row["avg_score"] = round(row["avg_score"], 2)
+    return rows
+
+
+class PracticeHistory:
+    """Practice attempts stored through an async, batched write-behind buffer.
+
+    ``record`` only appends to an in-memory buffer; a background task flushes it
+    with unordered ``insert_many`` every ``flush_interval`` seconds or as soon as
+    ``batch_size`` attempts are waiting. If MongoDB falls behind, the buffer is
+    capped at ``max_buffer`` and the oldest attempts are dropped (and counted)
+    rather than growing without bound. A failed batch is retried; attempts that
+    turn out to be written already (duplicate ``_id``) count as written, and
+    ones MongoDB rejects for good are dropped and counted as ``rejected``.
+    """
+
+    def __init__(self, collection, batch_size: int = 200, flush_interval: float = 1.0, max_buffer: int = 20000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.rejected = 0
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index([("agent_id", 1), ("scenario_id", 1), ("created_at", -1)])
+            await self.collection.create_index([("agent_id", 1), ("category", 1), ("created_at", -1)])
+            await self.collection.create_index([("category", 1), ("created_at", -1)])
+        except Exception as e:
+            logger.warning(f"Could not create practice history indexes: {e}")
+
+    def record(self, attempt: Dict[str, Any]):
+        """Queue one attempt for writing; never blocks the request path"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(attempt)
+        self.recorded += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                break
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self.flush():
+                    break
+
+    async def flush(self) -> bool:
+        """Write up to one batch; returns False if the write failed"""
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        if not batch:
+            return True
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.written += len(batch)
+            return True
+        except BulkWriteError as e:
+            # Unordered: every attempt without a write error was inserted
+            failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+            self.written += len(batch) - len(failed)
+            retry = []
+            for index, error in sorted(failed.items()):
+                if error.get("code") == DUPLICATE_KEY:
+                    # insert_many set _id on the dict, so this one landed on an earlier try
+                    self.written += 1
+                elif error.get("code") in RETRYABLE_WRITE_CODES:
+                    retry.append(batch[index])
+                else:
+                    self.rejected += 1
+                    logger.warning(f"Dropping practice attempt MongoDB rejected: {error.get('errmsg')}")
+            if not retry:
+                return True
+            self.write_errors += 1
+            self._requeue(retry)
+            return False
+        except Exception as e:
+            # The write may still have landed (e.g. a lost ack); retries see duplicate keys for those
+            self.write_errors += 1
+            logger.warning(f"Could not write {len(batch)} practice attempts, will retry: {e}")
+            self._requeue(batch)
+            return False
+
+    def _requeue(self, batch: List[dict]):
+        """Put attempts back in front, in order, for the next flush (dropping the oldest if the buffer is full)"""
+        space = self._buffer.maxlen - len(self._buffer)
+        if len(batch) > space:
+            self.dropped += len(batch) - space
+            batch = batch[len(batch) - space:]
+        self._buffer.extendleft(reversed(batch))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "rejected": self.rejected,
+        }
+
+    async def attempts(self, agent_id: str, scenario_id: Optional[int] = None, skip: int = 0, limit: int = 50) -> List[dict]:
+        """Most recent attempts of one agent"""
+        query: Dict[str, Any] = {"agent_id": agent_id}
+        if scenario_id is not None:
+            query["scenario_id"] = scenario_id
+        cursor = self.collection.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def agent_trend(
+        self, agent_id: str, scenario_id: Optional[int] = None, period: str = "day", skip: int = 0, limit: int = 30
+    ) -> List[dict]:
+        """Average score and attempt count per period for one agent, newest first"""
+        match: Dict[str, Any] = {"agent_id": agent_id}
+        if scenario_id is not None:
+            match["scenario_id"] = scenario_id
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {"$dateToString": {"format": PERIOD_FORMATS[period], "date": "$created_at"}},
+                "attempts": {"$sum": 1},
+                "avg_score": {"$avg": "$score"},
+                "best_score": {"$max": "$score"},
+            }},
+            {"$sort": {"_id": -1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "period": "$_id", "attempts": 1, "avg_score": 1, "best_score": 1}},
+        ]
+        return _round_scores(await self.collection.aggregate(pipeline).to_list(length=limit))
+
+    async def category_trend(
+        self,
+        agent_id: Optional[str] = None,
+        category: Optional[str] = None,
+        period: str = "week",
+        since: Optional[datetime] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[dict]:
+        """Average score per category and period, for one agent or the whole team"""
+        match: Dict[str, Any] = {}
+        if agent_id is not None:
+            match["agent_id"] = agent_id
+        if category is not None:
+            match["category"] = category
+        if since is not None:
+            match["created_at"] = {"$gte": since}
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": {
+                    "category": "$category",
+                    "period": {"$dateToString": {"format": PERIOD_FORMATS[period], "date": "$created_at"}},
+                },
+                "attempts": {"$sum": 1},
+                "avg_score": {"$avg": "$score"},
+            }},
+            {"$sort": {"_id.period": -1, "_id.category": 1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$project": {
+                "_id": 0,
+                "category": "$_id.category",
+                "period": "$_id.period",
+                "attempts": 1,
+                "avg_score": 1,
+            }},
+        ]
+        return _round_scores(await self.collection.aggregate(pipeline).to_list(length=limit))
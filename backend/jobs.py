@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = ("succeeded", "failed")
+
+
+class JobFailed(Exception):
+    """Raised by a handler for errors that retrying cannot fix"""
+
+
+class JobQueue:
+    """MongoDB-backed queue for AI generations that outlive an HTTP request.
+
+    ``enqueue`` inserts a job and returns at once. ``workers`` tasks per process
+    claim queued jobs with an atomic ``find_one_and_update`` that sets a lease,
+    renew the lease while the handler runs and record the result. A job whose
+    lease lapses (its worker died or was stopped) is claimed again by any
+    process. Failures are retried with backoff up to ``max_attempts`` times,
+    except ``JobFailed``. Finished jobs expire after ``retention``.
+    """
+
+    def __init__(
+        self,
+        collection,
+        handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]],
+        workers: int = 4,
+        lease_seconds: float = 60,
+        max_attempts: int = 3,
+        poll_interval: float = 1.0,
+        retention: timedelta = timedelta(hours=24),
+    ):
+        self.collection = collection
+        self.handlers = handlers
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.owner = uuid.uuid4().hex
+        self._wakeup = asyncio.Event()
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.enqueued = 0
+        self.running = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.lease_renewals = 0
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index([("status", 1), ("not_before", 1)])
+            await self.collection.create_index([("status", 1), ("lease_until", 1)])
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Could not create job indexes: {e}")
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = datetime.utcnow()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "not_before": now,
+            "lease_until": None,
+            "owner": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(job)
+        self.enqueued += 1
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Long-poll: the job once it has finished, or as it stands after ``timeout`` seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get(job_id)
+            remaining = deadline - loop.time()
+            if job is None or job["status"] in TERMINAL_STATES or remaining <= 0:
+                return job
+            # Woken at once if this process finishes the job; polls for jobs run elsewhere
+            event = self._finished.setdefault(job_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if not event.is_set():
+                    self._finished.pop(job_id, None)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop claiming; jobs cut short are picked up again once their lease lapses"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.warning(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            await self._execute(job)
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "not_before": {"$lte": now}},
+                {"status": "running", "lease_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "owner": self.owner,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _execute(self, job: Dict[str, Any]):
+        if job["attempts"] > self.max_attempts:
+            # Its earlier workers kept dying mid-run; don't let it take down more
+            self.failed += 1
+            await self._finish(job, {"status": "failed", "error": "Job lease expired too many times"})
+            return
+        self.running += 1
+        renewer = asyncio.create_task(self._renew_lease(job["_id"], job["attempts"]))
+        try:
+            result = await self.handlers[job["kind"]](job["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._fail(job, e)
+        else:
+            self.succeeded += 1
+            await self._finish(job, {"status": "succeeded", "result": result, "error": None})
+        finally:
+            renewer.cancel()
+            self.running -= 1
+
+    async def _renew_lease(self, job_id: str, attempts: int):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.collection.update_one(
+                    {"_id": job_id, "owner": self.owner, "attempts": attempts, "status": "running"},
+                    {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+                )
+                self.lease_renewals += 1
+            except Exception as e:
+                logger.warning(f"Could not renew lease of job {job_id}: {e}")
+
+    async def _fail(self, job: Dict[str, Any], error: Exception):
+        message = f"{type(error).__name__}: {error}" if not isinstance(error, JobFailed) else str(error)
+        if isinstance(error, JobFailed) or job["attempts"] >= self.max_attempts:
+            self.failed += 1
+            logger.warning(f"Job {job['_id']} ({job['kind']}) failed after {job['attempts']} attempt(s): {message}")
+            await self._finish(job, {"status": "failed", "error": message})
+            return
+        self.retried += 1
+        # Full jitter, so jobs failed by one upstream blip don't retry in lockstep
+        delay = random.uniform(0, min(60, 2 ** job["attempts"]))
+        await self._update(job, {
+            "status": "queued",
+            "error": message,
+            "not_before": datetime.utcnow() + timedelta(seconds=delay),
+            "lease_until": None,
+        })
+
+    async def _finish(self, job: Dict[str, Any], fields: Dict[str, Any]):
+        fields["expires_at"] = datetime.utcnow() + self.retention
+        fields["lease_until"] = None
+        await self._update(job, fields)
+        event = self._finished.pop(job["_id"], None)
+        if event is not None:
+            event.set()
+
+    async def _update(self, job: Dict[str, Any], fields: Dict[str, Any]):
+        fields["updated_at"] = datetime.utcnow()
+        try:
+            # Only the current lease holder may record an outcome
+            await self.collection.update_one(
+                {"_id": job["_id"], "owner": self.owner, "attempts": job["attempts"]}, {"$set": fields}
+            )
+        except Exception as e:
+            logger.warning(f"Could not record outcome of job {job['_id']}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._tasks),
+            "running": self.running,
+            "enqueued": self.enqueued,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "lease_renewals": self.lease_renewals,
+        }
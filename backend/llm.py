@@ -0,0 +1,328 @@
+import asyncio
+import logging
+import random
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _load_provider(provider: str):
+    """(chat class, message class) for an LLM provider name"""
+    if provider == "stub":
+        from llm_stub import StubLlmChat, StubUserMessage
+        return StubLlmChat, StubUserMessage
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    return LlmChat, UserMessage
+
+
+class LlmUnavailableError(Exception):
+    """The upstream model is unavailable (circuit open or queue full); retry later"""
+
+    def __init__(self, message: str, retry_after: float = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls are
+    rejected for ``reset_timeout`` seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def abandon_trial(self):
+        """Forget a half-open trial call that was cancelled before it finished"""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"LLM circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+
+class LlmClient:
+    """Long-lived gateway for all Gemini calls.
+
+    ``LlmChat`` keeps the conversation history of its session, so each call still
+    gets its own (cheap, network-free) chat object; what is shared is everything
+    around it: a concurrency limit with a bounded wait queue, a per-attempt
+    timeout, retries with jittered exponential backoff and a circuit breaker, so
+    a degraded upstream fails fast instead of piling up hung coroutines. An
+    optional ``rate_limiter`` (see ``shared.TokenBucketLimiter``) spends one token
+    per upstream attempt, keeping all workers together under the provider quota.
+
+    The provider integration is imported on first use (or by ``warm``), so
+    importing the server doesn't pay for it. ``stream`` yields the reply as the
+    provider produces it when its chat class has ``stream_message`` (the stub
+    does); the Gemini integration only offers ``send_message``, so there the
+    whole reply arrives as one chunk.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        max_concurrency: int = 16,
+        queue_timeout: float = 10,
+        call_timeout: float = 60,
+        max_retries: int = 2,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8,
+        breaker: Optional[CircuitBreaker] = None,
+        metrics=None,
+        provider: str = "emergent",
+        rate_limiter=None,
+    ):
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics
+        self.provider = provider
+        self.rate_limiter = rate_limiter
+        self._classes: Optional[Tuple[Any, Any]] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejections = 0
+
+    def _provider_classes(self) -> Tuple[Any, Any]:
+        if self._classes is None:
+            self._classes = _load_provider(self.provider)
+        return self._classes
+
+    def warm(self, model: Tuple[str, str]) -> float:
+        """Import the provider and build one (network-free) chat object; returns the seconds it took"""
+        started = time.perf_counter()
+        self._chat("warmup", "", model, None)
+        return time.perf_counter() - started
+
+    def _chat(self, session_prefix: str, system_message: str, model: Tuple[str, str], max_output_tokens: Optional[int]):
+        chat_class, _ = self._provider_classes()
+        chat = chat_class(
+            api_key=self.api_key,
+            session_id=f"{session_prefix}_{uuid.uuid4()}",
+            system_message=system_message,
+        ).with_model(*model)
+        if max_output_tokens:
+            chat = chat.with_max_tokens(max_output_tokens)
+        return chat
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def send(
+        self,
+        session_prefix: str,
+        system_message: str,
+        model: Tuple[str, str],
+        text: str,
+        max_output_tokens: Optional[int] = None,
+    ) -> str:
+        """Send one prompt and return the reply text (at most ``max_output_tokens`` long, if given)"""
+        await self._acquire()
+        self.in_flight += 1
+        try:
+            return await self._send_with_retries(session_prefix, system_message, model, text, max_output_tokens)
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def stream(
+        self,
+        session_prefix: str,
+        system_message: str,
+        model: Tuple[str, str],
+        text: str,
+        max_output_tokens: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """Yield the reply in chunks as they arrive.
+
+        Failures before the first chunk are retried like ``send``; once text has
+        been handed out they are raised. The concurrency slot is held until the
+        stream ends or is closed.
+        """
+        await self._acquire()
+        self.in_flight += 1
+        try:
+            attempt = 0
+            while True:
+                await self._admit()
+                started = time.perf_counter()
+                received = []
+                chunks = self._open_stream(session_prefix, system_message, model, text, max_output_tokens)
+                finished = False
+                try:
+                    async for chunk in chunks:
+                        received.append(chunk)
+                        yield chunk
+                    finished = True
+                except Exception as e:
+                    if received:
+                        self._record_failure(model, e)
+                        raise
+                    attempt = await self._retry_or_raise(model, e, attempt)
+                    continue
+                finally:
+                    await chunks.aclose()
+                    if not finished:
+                        # Caller went away (or the stream broke); a half-open trial must not stay claimed
+                        self.breaker.abandon_trial()
+                self._record_success(model, started, system_message, text, "".join(received))
+                return
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _open_stream(
+        self, session_prefix: str, system_message: str, model: Tuple[str, str], text: str, max_output_tokens: Optional[int]
+    ) -> AsyncIterator[str]:
+        """One attempt's chunks, each awaited within what is left of ``call_timeout``"""
+        chat = self._chat(session_prefix, system_message, model, max_output_tokens)
+        message = self._provider_classes()[1](text=text)
+        stream_message = getattr(chat, "stream_message", None)
+        if stream_message is None:
+            yield await asyncio.wait_for(chat.send_message(message), self.call_timeout)
+            return
+        deadline = time.monotonic() + self.call_timeout
+        chunks = stream_message(message).__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    return
+                if chunk:
+                    yield chunk
+        finally:
+            await chunks.aclose()
+
+    async def _acquire(self):
+        """Take a concurrency slot, waiting at most ``queue_timeout``"""
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejections += 1
+            raise LlmUnavailableError("Too many concurrent AI requests, please retry", retry_after=1)
+        finally:
+            self.queued -= 1
+
+    async def _admit(self):
+        """Spend a rate-limit token and pass the circuit breaker, or raise LlmUnavailableError"""
+        if self.rate_limiter is not None:
+            retry_after = await self.rate_limiter.acquire(self.queue_timeout)
+            if retry_after:
+                self.rejections += 1
+                raise LlmUnavailableError("AI request quota reached, please retry", retry_after=retry_after)
+        if not self.breaker.allow():
+            self.rejections += 1
+            raise LlmUnavailableError("AI service is temporarily unavailable", retry_after=self.breaker.retry_after())
+        self.calls += 1
+
+    def _record_failure(self, model: Tuple[str, str], error: Exception):
+        self.failures += 1
+        self.breaker.record_failure()
+        if self.metrics is not None:
+            self.metrics.inc("llm_errors_total", model=model[1], error=type(error).__name__)
+
+    async def _retry_or_raise(self, model: Tuple[str, str], error: Exception, attempt: int) -> int:
+        """Record a failed attempt, then back off (returning the next attempt number) or re-raise"""
+        self._record_failure(model, error)
+        if attempt >= self.max_retries:
+            raise error
+        delay = self._backoff(attempt)
+        self.retries += 1
+        logger.warning(f"LLM call failed ({type(error).__name__}: {error}); retry {attempt + 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        return attempt + 1
+
+    def _record_success(self, model: Tuple[str, str], started: float, system_message: str, text: str, reply: str):
+        self.breaker.record_success()
+        if self.metrics is not None:
+            # The integration doesn't report token usage, so record sizes in characters
+            self.metrics.observe("llm_request_duration_seconds", time.perf_counter() - started, model=model[1])
+            self.metrics.inc("llm_prompt_chars_total", len(system_message) + len(text), model=model[1])
+            self.metrics.inc("llm_completion_chars_total", len(reply), model=model[1])
+
+    async def _send_with_retries(
+        self, session_prefix: str, system_message: str, model: Tuple[str, str], text: str, max_output_tokens: Optional[int]
+    ) -> str:
+        attempt = 0
+        while True:
+            await self._admit()
+            started = time.perf_counter()
+            try:
+                chat = self._chat(session_prefix, system_message, model, max_output_tokens)
+                message = self._provider_classes()[1](text=text)
+                reply = await asyncio.wait_for(chat.send_message(message), self.call_timeout)
+            except asyncio.CancelledError:
+                # Caller went away; don't count it against the upstream
+                self.breaker.abandon_trial()
+                raise
+            except Exception as e:
+                attempt = await self._retry_or_raise(model, e, attempt)
+                continue
+            self._record_success(model, started, system_message, text, reply)
+            return reply
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejections": self.rejections,
+            "circuit": self.breaker.state,
+            "rate_limit": self.rate_limiter.stats() if self.rate_limiter is not None else None,
+        }
@@ -0,0 +1,106 @@
+"""Local stand-in for the Gemini chat integration, for benchmarks and offline runs.
+
+Selected with ``LLM_PROVIDER=stub``. Replies arrive after ``LLM_STUB_LATENCY_MS``
+(+/- uniform ``LLM_STUB_JITTER_MS``); ``LLM_STUB_MODEL_LATENCY_MS`` overrides the
+latency per model (``"gemini-2.5-flash=300,gemini-2.5-pro=1200"``), and a
+``LLM_STUB_TAIL_RATE`` fraction of calls takes ``LLM_STUB_TAIL_MS`` longer, to
+exercise model routing and hedging. Replies follow the same structure the real
+prompts ask for (JSON for feedback, markdown for coaching), so parsing and
+streaming behave as in production.
+
+``stream_message`` yields the reply word by word: the first word after
+``LLM_STUB_FIRST_TOKEN_MS`` (default a quarter of the latency), the rest spread
+evenly over the remaining latency.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+
+
+def _parse_model_latency(spec: str) -> dict:
+    latency = {}
+    for item in spec.split(","):
+        model, sep, ms = item.partition("=")
+        if sep:
+            latency[model.strip()] = float(ms) / 1000
+    return latency
+
+
+_MODEL_LATENCY = _parse_model_latency(os.environ.get("LLM_STUB_MODEL_LATENCY_MS", ""))
+_TAIL_RATE = float(os.environ.get("LLM_STUB_TAIL_RATE", "0"))
+_TAIL_LATENCY = float(os.environ.get("LLM_STUB_TAIL_MS", "0")) / 1000
+_FIRST_TOKEN_LATENCY = os.environ.get("LLM_STUB_FIRST_TOKEN_MS")
+_WORD_RE = re.compile(r"\S+\s*|\s+")
+
+
+class StubUserMessage:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubLlmChat:
+    def __init__(self, api_key=None, session_id=None, system_message=""):
+        self.session_id = session_id
+        self.system_message = system_message
+        self.provider = None
+        self.model = None
+        self.max_tokens = None
+        self.latency = float(os.environ.get("LLM_STUB_LATENCY_MS", "800")) / 1000
+        self.jitter = float(os.environ.get("LLM_STUB_JITTER_MS", "200")) / 1000
+        self.failure_rate = float(os.environ.get("LLM_STUB_FAILURE_RATE", "0"))
+
+    def with_model(self, provider: str, model: str) -> "StubLlmChat":
+        self.provider = provider
+        self.model = model
+        return self
+
+    def with_max_tokens(self, max_tokens: int) -> "StubLlmChat":
+        self.max_tokens = max_tokens
+        return self
+
+    def _latency(self) -> float:
+        latency = _MODEL_LATENCY.get(self.model, self.latency)
+        if random.random() < _TAIL_RATE:
+            latency += _TAIL_LATENCY
+        return max(0.0, latency + random.uniform(-self.jitter, self.jitter))
+
+    async def send_message(self, user_message) -> str:
+        await asyncio.sleep(self._latency())
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Stub upstream error")
+        return self._reply()
+
+    async def stream_message(self, user_message):
+        latency = self._latency()
+        first = float(_FIRST_TOKEN_LATENCY) / 1000 if _FIRST_TOKEN_LATENCY else latency / 4
+        await asyncio.sleep(min(first, latency))
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Stub upstream error")
+        words = _WORD_RE.findall(self._reply())
+        gap = max(0.0, latency - first) / max(1, len(words) - 1)
+        for index, word in enumerate(words):
+            if index:
+                await asyncio.sleep(gap)
+            yield word
+
+    def _reply(self) -> str:
+        if "sales trainer" in self.system_message:
+            return json.dumps({
+                "score": random.randint(5, 9),
+                "strengths": ["You acknowledged the concern before answering."],
+                "suggestions": [
+                    "Quantify the value with one concrete number",
+                    "Ask a follow-up question to uncover the real objection",
+                    "Close with a clear next step",
+                ],
+            })
+        return (
+            "**Quick Strategy:** Acknowledge the concern, then reframe it around value.\n"
+            "**What to Say:**\n"
+            "- \"I understand - let's look at what you get for that.\"\n"
+            "- \"Most of our merchants recover the cost within the first month.\"\n"
+            "- \"Can we try it for two weeks and measure the difference?\"\n"
+            "**Why This Works:** It validates the merchant while moving the focus to outcomes."
+        )
@@ -0,0 +1,135 @@
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from cache import normalize_text
+
+# Words for the same objection that share no characters (English vs Hinglish).
+# Each concept is one extra feature with a count of CONCEPT_WEIGHT, so that after
+# sublinear TF one concept word carries about as much as a short phrase
+CONCEPTS = {
+    "costly": ("expensive", "costly", "pricey", "overpriced", "mehenga", "mehnga", "mahanga", "afford", "budget"),
+}
+CONCEPT_WEIGHT = 150
+_CONCEPT_OF = {word: concept for concept, words in CONCEPTS.items() for word in words}
+
+
+def char_ngrams(text: str, sizes: Sequence[int] = (2, 3, 4)) -> Dict[str, int]:
+    """Character n-gram counts of the normalized text (robust to Hinglish spelling)"""
+    padded = f" {normalize_text(text)} "
+    counts: Dict[str, int] = {}
+    for n in sizes:
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def text_features(text: str, sizes: Sequence[int] = (2, 3, 4)) -> Dict[str, int]:
+    """Character n-gram counts plus a ``<concept>`` feature per concept the text mentions"""
+    features = char_ngrams(text, sizes)
+    for word in normalize_text(text).split():
+        concept = _CONCEPT_OF.get(word)
+        if concept is not None:
+            features[f"<{concept}>"] = CONCEPT_WEIGHT
+    return features
+
+
+class ScenarioMatcher:
+    """In-process TF-IDF index over scenario objections for nearest-scenario lookup.
+
+    Each scenario is indexed by its objection plus its context (which names the
+    merchant's concern in plain English, so Hinglish objections are found from
+    English phrasings too) and its ``CONCEPTS``. Documents are embedded as
+    L2-normalized, sublinear-TF x IDF vectors of character n-grams and stored as
+    a sparse column index (CSR over n-grams), so a query only touches the
+    postings of its own n-grams and scoring is a single ``np.bincount``.
+    Rebuild with ``build`` whenever the catalog changes.
+    """
+
+    def __init__(self, sizes: Sequence[int] = (2, 3, 4)):
+        self.sizes = tuple(sizes)
+        self._scenarios: List[dict] = []
+        self._vocab: Dict[str, int] = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self._scenarios)
+
+    def build(self, scenarios: Sequence[dict]):
+        scenarios = list(scenarios)
+        docs = [
+            text_features(f"{s['objection']} {s.get('context', '')}", self.sizes) for s in scenarios
+        ]
+
+        vocab: Dict[str, int] = {}
+        doc_freq: List[int] = []
+        for grams in docs:
+            for gram in grams:
+                col = vocab.get(gram)
+                if col is None:
+                    vocab[gram] = len(doc_freq)
+                    doc_freq.append(1)
+                else:
+                    doc_freq[col] += 1
+        n_docs = max(1, len(docs))
+        idf = np.log((1 + n_docs) / (1 + np.asarray(doc_freq, dtype=np.float64))) + 1
+
+        # Row-wise weights, then transposed into per-n-gram postings
+        postings: List[List[Tuple[int, float]]] = [[] for _ in doc_freq]
+        for row, grams in enumerate(docs):
+            weighted = {vocab[g]: (1 + math.log(c)) * idf[vocab[g]] for g, c in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weighted.values())) or 1.0
+            for col, w in weighted.items():
+                postings[col].append((row, w / norm))
+
+        indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(p) for p in postings])
+        rows = np.fromiter((r for p in postings for r, _ in p), dtype=np.int32, count=int(indptr[-1]))
+        weights = np.fromiter((w for p in postings for _, w in p), dtype=np.float32, count=int(indptr[-1]))
+
+        # Swap everything in at once
+        self._scenarios = scenarios
+        self._vocab = vocab
+        self._idf = idf.astype(np.float32)
+        self._indptr = indptr
+        self._rows = rows
+        self._weights = weights
+
+    def match(self, text: str, k: int = 3) -> List[Tuple[dict, float]]:
+        """Top-k (scenario, cosine similarity) pairs for free text, best first"""
+        if not self._scenarios:
+            return []
+        grams = text_features(text, self.sizes)
+        cols = []
+        query = []
+        for gram, count in grams.items():
+            col = self._vocab.get(gram)
+            if col is not None:
+                cols.append(col)
+                query.append((1 + math.log(count)) * self._idf[col])
+        if not cols:
+            return []
+        # Normalize over all query n-grams, including ones unseen in the catalog
+        unseen = sum((1 + math.log(c)) ** 2 for g, c in grams.items() if g not in self._vocab)
+        query = np.asarray(query, dtype=np.float32)
+        query /= math.sqrt(float(query @ query) + unseen)
+
+        cols = np.asarray(cols, dtype=np.int64)
+        starts, ends = self._indptr[cols], self._indptr[cols + 1]
+        lengths = ends - starts
+        # Gather the postings of every query n-gram in one shot
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        scores = np.bincount(
+            self._rows[offsets],
+            weights=self._weights[offsets] * np.repeat(query, lengths),
+            minlength=len(self._scenarios),
+        )
+        k = min(k, len(self._scenarios))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._scenarios[i], float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,215 @@
+import bisect
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+access_logger = logging.getLogger("access")
+
+# Seconds; spans cache hits (sub-millisecond) to slow model replies
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (
+        f'{k}="' + v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"'
+        for k, v in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Minimal in-process metrics with Prometheus text exposition.
+
+    Counters, gauges and histograms are keyed by name and a label set. Values
+    owned by other components (cache counters, LLM client state) are pulled at
+    scrape time through ``register_collector`` instead of being mirrored.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        series = self._counters.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def gauge_add(self, name: str, amount: float, **labels):
+        series = self._gauges.setdefault(name, {})
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        series = self._histograms.setdefault(name, {})
+        key = _labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = _Histogram(self.buckets)
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]):
+        """``collector()`` yields (name, kind, labels, value) samples at scrape time"""
+        self._collectors.append(collector)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def header(name: str, default_kind: str):
+            kind, help_text = self._help.get(name, (default_kind, ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name, series in sorted(self._counters.items()):
+            header(name, "counter")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for name, series in sorted(self._gauges.items()):
+            header(name, "gauge")
+            for labels, value in series.items():
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for name, series in sorted(self._histograms.items()):
+            header(name, "histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                for upper, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', f'{upper:g}'))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        collected: Dict[str, List[Tuple[str, Dict[str, str], float]]] = {}
+        for collector in self._collectors:
+            for name, kind, labels, value in collector():
+                collected.setdefault(name, []).append((kind, labels, value))
+        for name, samples in sorted(collected.items()):
+            header(name, samples[0][0])
+            for _, labels, value in samples:
+                lines.append(f"{name}{_format_labels(_labels(labels))} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+        """p50/p95/p99 (seconds) and counts for every histogram series"""
+        result: Dict[str, Dict[str, Dict[str, Optional[float]]]] = {}
+        for name, series in self._histograms.items():
+            for labels, histogram in series.items():
+                label_text = ",".join(f"{k}={v}" for k, v in labels) or "all"
+                quantiles = {f"p{round(q * 100)}": histogram.quantile(q) for q in (0.50, 0.95, 0.99)}
+                result.setdefault(name, {})[label_text] = {
+                    "count": histogram.count,
+                    **{k: None if v is None else round(v, 6) for k, v in quantiles.items()},
+                }
+        return result
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, status and in-flight requests.
+
+    Timing covers the whole response including streamed bodies. Routes are
+    labelled by their path template so ids in URLs don't explode cardinality.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry, json_access_log: bool = False):
+        self.app = app
+        self.registry = registry
+        self.json_access_log = json_access_log
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        started = time.perf_counter()
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        registry.gauge_add("http_requests_in_flight", 1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            registry.inc("http_unhandled_errors_total", error=type(e).__name__)
+            raise
+        finally:
+            registry.gauge_add("http_requests_in_flight", -1)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            status = status_holder["status"]
+            registry.observe("http_request_duration_seconds", elapsed, route=route_path, method=method)
+            registry.inc("http_requests_total", route=route_path, method=method, status=str(status))
+            if self.json_access_log:
+                client = scope.get("client")
+                access_logger.info(json.dumps({
+                    "method": method,
+                    "path": scope["path"],
+                    "route": route_path,
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "client": client[0] if client else None,
+                }))
@@ -0,0 +1,213 @@
+import heapq
+import logging
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Priority of a scenario the agent has never practiced; a practiced scenario
+# reaches it when it's exactly due and fully mastered
+NEW_PRIORITY = 1.0
+# Cap on how overdue a scenario counts, so one neglected scenario can't dominate
+OVERDUE_CAP = 4.0
+# Attempts beyond this don't lengthen the review interval further
+MAX_STREAK = 6
+# Random spread added to priorities so equal candidates vary between sessions
+JITTER = 0.05
+# Weight of the newest score in the running estimate
+SCORE_ALPHA = 0.5
+
+
+def _epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class AgentState:
+    """Practice record of one agent: one array slot per practiced scenario, sorted by id.
+
+    Scores are a running estimate (NaN until a score is known). An agent who has
+    practiced m scenarios costs about 20 * m bytes, whatever the catalog size.
+    """
+
+    __slots__ = ("ids", "attempts", "last_at", "score", "loaded_at")
+
+    def __init__(self, ids=(), attempts=(), last_at=(), score=()):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.attempts = np.asarray(attempts, dtype=np.int32)
+        self.last_at = np.asarray(last_at, dtype=np.float64)
+        self.score = np.asarray(score, dtype=np.float32)
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def observe(self, scenario_id: int, score: Optional[int], at: float):
+        index = int(np.searchsorted(self.ids, scenario_id))
+        if index == len(self.ids) or self.ids[index] != scenario_id:
+            self.ids = np.insert(self.ids, index, scenario_id)
+            self.attempts = np.insert(self.attempts, index, 0)
+            self.last_at = np.insert(self.last_at, index, at)
+            self.score = np.insert(self.score, index, np.nan)
+        self.attempts[index] += 1
+        self.last_at[index] = max(self.last_at[index], at)
+        if score is not None:
+            previous = self.score[index]
+            self.score[index] = score if np.isnan(previous) else (1 - SCORE_ALPHA) * previous + SCORE_ALPHA * score
+
+
+class PracticeSelector:
+    """Chooses the scenarios each agent most needs to practice next.
+
+    Every practiced scenario gets a spaced-repetition interval that doubles with
+    each attempt, scaled by how well the agent scores on it, so weak scenarios
+    come back after about ``base_interval`` while mastered ones fade out. Its
+    priority is how overdue it is, boosted by weakness; never-practiced scenarios
+    sit at a fixed priority in between. Per-agent state is loaded from the
+    practice history on first use, kept in an LRU of ``max_agents`` entries for
+    ``state_ttl`` seconds (so other workers' attempts are picked up) and updated
+    in place as feedback is recorded.
+
+    Selection only touches the agent's practiced scenarios plus ``k`` sampled
+    new ones, then keeps the top ``k`` with a heap, so its cost does not grow
+    with the catalog.
+    """
+
+    def __init__(
+        self,
+        collection,
+        store,
+        max_agents: int = 10000,
+        state_ttl: float = 300,
+        base_interval: float = 86400,
+        weakness_weight: float = 1.0,
+    ):
+        self.collection = collection
+        self.store = store
+        self.max_agents = max_agents
+        self.state_ttl = state_ttl
+        self.base_interval = base_interval
+        self.weakness_weight = weakness_weight
+        self._states: "OrderedDict[str, AgentState]" = OrderedDict()
+        self._loads = SingleFlight()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    async def select(self, agent_id: str, k: int = 10, category: Optional[str] = None) -> List[int]:
+        """Catalog positions of the ``k`` scenarios to practice next, most needed first"""
+        candidates = self.store.positions(category)
+        if not candidates:
+            return []
+        state = await self._state(agent_id)
+        scored = []
+        practiced: Set[int] = set()
+        if len(state):
+            scenarios = self.store.all()
+            for scenario_id, priority in zip(state.ids.tolist(), self._priorities(state, time.time()).tolist()):
+                position = self.store.position(scenario_id)
+                # Skip scenarios removed from the catalog or outside the category
+                if position is None or (category is not None and scenarios[position]["category"] != category):
+                    continue
+                practiced.add(position)
+                scored.append((priority, position))
+        for position in _sample_excluding(candidates, practiced, k):
+            scored.append((NEW_PRIORITY + random.random() * JITTER, position))
+        return [position for _, position in heapq.nlargest(k, scored)]
+
+    def observe(self, agent_id: str, scenario_id: int, score: Optional[int]):
+        """Fold a new attempt into the agent's cached state, if it is cached"""
+        state = self._states.get(agent_id)
+        if state is not None:
+            state.observe(scenario_id, score, time.time())
+
+    def clear(self):
+        self._states.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "agents": len(self._states),
+            "max_agents": self.max_agents,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+    def _priorities(self, state: AgentState, now: float) -> np.ndarray:
+        # Unknown scores count as middling
+        score = np.where(np.isnan(state.score), 5.5, state.score)
+        mastery = np.clip((score - 1) / 9, 0, 1)
+        interval = self.base_interval * np.exp2(np.minimum(state.attempts, MAX_STREAK) * mastery)
+        overdue = np.minimum((now - state.last_at) / interval, OVERDUE_CAP)
+        jitter = np.random.random(len(state)) * JITTER
+        return (1 + self.weakness_weight * (1 - mastery)) * overdue + jitter
+
+    async def _state(self, agent_id: str) -> AgentState:
+        state = self._states.get(agent_id)
+        if state is not None and time.monotonic() - state.loaded_at < self.state_ttl:
+            self._states.move_to_end(agent_id)
+            self.hits += 1
+            return state
+        return await self._loads.do(agent_id, lambda: self._load(agent_id))
+
+    async def _load(self, agent_id: str) -> AgentState:
+        pipeline = [
+            {"$match": {"agent_id": agent_id}},
+            {"$sort": {"created_at": 1}},
+            {"$group": {
+                "_id": "$scenario_id",
+                "attempts": {"$sum": 1},
+                "last_at": {"$max": "$created_at"},
+                "avg_score": {"$avg": "$score"},
+                "last_score": {"$last": "$score"},
+            }},
+            {"$sort": {"_id": 1}},
+        ]
+        try:
+            rows = await self.collection.aggregate(pipeline).to_list(length=None)
+        except Exception as e:
+            logger.warning(f"Could not load practice state for {agent_id}, using an empty one: {e}")
+            return AgentState()
+
+        self.loads += 1
+        state = AgentState(
+            ids=[row["_id"] for row in rows],
+            attempts=[row["attempts"] for row in rows],
+            last_at=[_epoch(row["last_at"]) for row in rows],
+            # Approximates the running estimate from the stored aggregates
+            score=[_blend(row.get("avg_score"), row.get("last_score")) for row in rows],
+        )
+        self._states[agent_id] = state
+        self._states.move_to_end(agent_id)
+        while len(self._states) > self.max_agents:
+            self._states.popitem(last=False)
+            self.evictions += 1
+        return state
+
+
+def _blend(avg_score: Optional[float], last_score: Optional[float]) -> float:
+    known = [s for s in (avg_score, last_score) if s is not None]
+    return sum(known) / len(known) if known else np.nan
+
+
+def _sample_excluding(candidates: Sequence[int], excluded: Set[int], k: int) -> List[int]:
+    """Up to ``k`` random candidates not in ``excluded``, without scanning all candidates when possible"""
+    picked: Set[int] = set()
+    for _ in range(4 * k):
+        if len(picked) == k:
+            return list(picked)
+        position = candidates[random.randrange(len(candidates))]
+        if position not in excluded:
+            picked.add(position)
+    # Most candidates are excluded: fall back to a scan
+    remaining = [p for p in candidates if p not in excluded and p not in picked]
+    picked.update(random.sample(remaining, min(k - len(picked), len(remaining))))
+    return list(picked)
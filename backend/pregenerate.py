@@ -0,0 +1,198 @@
+"""Offline pre-generation of coaching responses for every scenario x language.
+
+Run from the backend directory::
+
+    python pregenerate.py --workers 8
+    python pregenerate.py --languages English Hindi --max-age-days 30
+
+Responses are stored in the ``precomputed_responses`` collection keyed by the
+hash of the exact prompt (system message, user prompt and model) that produced
+them, so editing a template or a scenario makes the old entry unreachable and
+the next run regenerates it. Languages whose prompts render identically (Hindi
+and Hinglish share a language instruction) share one entry. Runs are resumable:
+anything already stored under its current hash is skipped.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+KeyFn = Callable[[dict, str], str]
+GenerateFn = Callable[[dict, str], Awaitable[str]]
+
+
+def prompt_hash(*parts: str) -> str:
+    """Stable version key for a fully rendered prompt"""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class PrecomputedStore:
+    """MongoDB-backed store of pre-generated responses, versioned by prompt hash"""
+
+    def __init__(self, collection, key_fn: KeyFn):
+        self.collection = collection
+        self.key_fn = key_fn
+        self.hits = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index([("scenario_id", 1), ("language", 1)])
+            await self.collection.create_index("generated_at")
+        except Exception as e:
+            logger.warning(f"Could not create precomputed response indexes: {e}")
+
+    async def get(self, scenario: dict, language: str) -> Optional[str]:
+        try:
+            doc = await self.collection.find_one({"_id": self.key_fn(scenario, language)}, {"response": 1})
+        except Exception as e:
+            logger.warning(f"Could not read precomputed response: {e}")
+            doc = None
+        if doc is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return doc["response"]
+
+    async def put(self, scenario: dict, language: str, response: str):
+        key = self.key_fn(scenario, language)
+        await self.collection.replace_one(
+            {"_id": key},
+            {
+                "_id": key,
+                "scenario_id": scenario["id"],
+                "language": language,
+                "response": response,
+                "generated_at": datetime.utcnow(),
+            },
+            upsert=True,
+        )
+
+    async def pending(
+        self,
+        scenarios: Iterable[dict],
+        languages: Sequence[str],
+        max_age: Optional[timedelta] = None,
+    ) -> List[Tuple[dict, str]]:
+        """(scenario, language) pairs with no current entry, or one older than ``max_age``"""
+        wanted: Dict[str, Tuple[dict, str]] = {}
+        for scenario in scenarios:
+            for language in languages:
+                # Languages that render to the same prompt share one entry
+                wanted.setdefault(self.key_fn(scenario, language), (scenario, language))
+
+        query = {"_id": {"$in": list(wanted)}}
+        if max_age is not None:
+            query["generated_at"] = {"$gte": datetime.utcnow() - max_age}
+        fresh = set()
+        async for doc in self.collection.find(query, {"_id": 1}):
+            fresh.add(doc["_id"])
+        return [pair for key, pair in wanted.items() if key not in fresh]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+async def pregenerate(
+    store: PrecomputedStore,
+    scenarios: Iterable[dict],
+    languages: Sequence[str],
+    generate: GenerateFn,
+    workers: int = 4,
+    max_age: Optional[timedelta] = None,
+) -> Dict[str, int]:
+    """Generate and store every missing or stale response with a pool of workers"""
+    todo = await store.pending(scenarios, languages, max_age)
+    queue: "asyncio.Queue[Tuple[dict, str]]" = asyncio.Queue()
+    for pair in todo:
+        queue.put_nowait(pair)
+    counts = {"pending": len(todo), "generated": 0, "failed": 0}
+    logger.info(f"{len(todo)} responses to generate with {workers} workers")
+
+    async def worker():
+        while True:
+            try:
+                scenario, language = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                response = await generate(scenario, language)
+                # Stored one at a time so a crash loses at most the in-flight work
+                await store.put(scenario, language, response)
+                counts["generated"] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                logger.warning(f"Failed to generate scenario {scenario['id']} ({language}): {e}")
+            done = counts["generated"] + counts["failed"]
+            if done % 20 == 0 or done == counts["pending"]:
+                logger.info(f"Progress: {done}/{counts['pending']} ({counts['failed']} failed)")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    return counts
+
+
+async def refresh_forever(
+    store: PrecomputedStore,
+    scenarios: Callable[[], Iterable[dict]],
+    languages: Sequence[str],
+    generate: GenerateFn,
+    interval: float,
+    workers: int = 2,
+    max_age: Optional[timedelta] = None,
+):
+    """Background task: periodically regenerate missing or stale entries"""
+    while True:
+        started = time.monotonic()
+        try:
+            counts = await pregenerate(store, scenarios(), languages, generate, workers, max_age)
+            if counts["pending"]:
+                logger.info(f"Refreshed precomputed responses: {counts}")
+        except Exception as e:
+            logger.warning(f"Precomputed response refresh failed: {e}")
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def _main(args):
+    import server
+
+    await server.scenario_store.reload()
+    await server.precomputed_store.ensure_indexes()
+    scenarios = server.scenario_store.all()
+    if args.scenarios:
+        wanted_ids = set(args.scenarios)
+        scenarios = [s for s in scenarios if s["id"] in wanted_ids]
+    max_age = timedelta(days=args.max_age_days) if args.max_age_days else None
+    try:
+        counts = await pregenerate(
+            server.precomputed_store,
+            scenarios,
+            args.languages,
+            server._generate_scenario_response,
+            workers=args.workers,
+            max_age=max_age,
+        )
+    finally:
+        server.client.close()
+    logger.info(f"Done: {counts}")
+    return 1 if counts["failed"] else 0
+
+
+def main(argv=None):
+    from server import SUPPORTED_LANGUAGES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="concurrent LLM calls")
+    parser.add_argument("--languages", nargs="+", default=SUPPORTED_LANGUAGES, choices=SUPPORTED_LANGUAGES)
+    parser.add_argument("--scenarios", nargs="+", type=int, help="only these scenario ids")
+    parser.add_argument("--max-age-days", type=float, help="also regenerate entries older than this")
+    args = parser.parse_args(argv)
+    return asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,201 @@
+"""Prompt templates for the model calls, compiled once and versioned.
+
+Each template is whitespace-normalized when it is built, so no indentation from
+the source file reaches the model, and hashed into a ``version`` that changes
+whenever its text, field budgets or output limit change. Cache keys and the
+pre-generated response store use that version, so editing a prompt retires the
+replies produced by the old one without touching anything else.
+
+Free-text fields (the agent's objection or answer, scenario context) are trimmed
+to a token budget before rendering, using a local estimate: the integration does
+not expose the model's tokenizer, and an estimate that errs high is enough to
+keep prompts bounded.
+"""
+import hashlib
+import re
+import string
+from typing import Dict, Iterable, Optional
+
+from feedback_parser import FEEDBACK_JSON_CONTRACT
+
+# Bump when a template changes meaning without its text changing (e.g. a new model)
+OBJECTION_PROMPT_VERSION = 3
+FEEDBACK_PROMPT_VERSION = 2
+
+# Latin words, digit runs, or any other single non-space character
+_TOKEN_PIECE_RE = re.compile(r"[A-Za-z]+|[0-9]+|\S")
+_BLANK_RUN_RE = re.compile(r"\n{3,}")
+
+ELLIPSIS = "…"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 characters per Latin word piece, one per digit run,
+    symbol or non-Latin character (Indic scripts tokenize at about that rate)"""
+    tokens = 0
+    for piece in _TOKEN_PIECE_RE.findall(text):
+        tokens += (len(piece) + 3) // 4 if piece[0].isascii() and piece[0].isalpha() else 1
+    return tokens
+
+
+def trim_to_tokens(text: str, budget: int) -> str:
+    """``text`` cut at a word boundary to about ``budget`` tokens, marked with an ellipsis"""
+    if budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+    used = 0
+    end = 0
+    for match in _TOKEN_PIECE_RE.finditer(text):
+        piece = match.group()
+        cost = (len(piece) + 3) // 4 if piece[0].isascii() and piece[0].isalpha() else 1
+        # Leave one token for the ellipsis
+        if used + cost > budget - 1:
+            break
+        used += cost
+        end = match.end()
+    cut = text[:end]
+    # Don't end on half a word when the next piece continues it
+    if end < len(text) and not text[end].isspace():
+        space = cut.rfind(" ")
+        if space > len(cut) // 2:
+            cut = cut[:space]
+    return cut.rstrip() + ELLIPSIS
+
+
+def normalize_whitespace(text: str) -> str:
+    """Strip each line, and collapse blank-line runs to a single blank line"""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return _BLANK_RUN_RE.sub("\n\n", "\n".join(lines))
+
+
+class PromptTemplate:
+    """System message and user-prompt template of one endpoint (and language).
+
+    ``field_budgets`` maps template fields to the most tokens they may take;
+    fields not listed are inserted as given. ``family`` (default ``name``)
+    prefixes the version instead of the name, so variants of one endpoint whose
+    text comes out identical (e.g. Hindi and Hinglish) share a version.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        revision: int,
+        system: str,
+        user: str,
+        max_output_tokens: Optional[int] = None,
+        field_budgets: Optional[Dict[str, int]] = None,
+        family: Optional[str] = None,
+    ):
+        self.name = name
+        self.system = normalize_whitespace(system)
+        self.user = normalize_whitespace(user)
+        self.max_output_tokens = max_output_tokens or None
+        self.field_budgets = dict(field_budgets or {})
+        self.fields = {field for _, field, _, _ in string.Formatter().parse(self.user) if field}
+        unknown = set(self.field_budgets) - self.fields
+        if unknown:
+            raise ValueError(f"Budget for unknown field(s) of {name}: {', '.join(sorted(unknown))}")
+        self.system_tokens = estimate_tokens(self.system)
+        digest = hashlib.sha1("\x1f".join([
+            self.system,
+            self.user,
+            repr(sorted(self.field_budgets.items())),
+            str(self.max_output_tokens),
+        ]).encode("utf-8")).hexdigest()[:12]
+        self.version = f"{family or name}.v{revision}.{digest}"
+
+    def render(self, **fields: str) -> str:
+        for field, budget in self.field_budgets.items():
+            fields[field] = trim_to_tokens(fields[field], budget)
+        return self.user.format_map(fields)
+
+
+def _language_instruction(language: str) -> str:
+    if language in ["Hindi", "Hinglish"]:
+        return "Respond in Hindi/Hinglish mixing as appropriate for the input language."
+    if language in ["Marathi", "Kannada", "Tamil", "Telugu", "Bangla"]:
+        return f"Respond in {language} language to match the input."
+    return "Respond in English."
+
+
+class PromptCatalog:
+    """All templates, compiled up front for every supported language.
+
+    ``input_tokens`` bounds the agent's own text, ``context_tokens`` each piece
+    of scenario context. Output limits of 0 leave the model's default.
+    """
+
+    def __init__(
+        self,
+        languages: Iterable[str],
+        input_tokens: int = 300,
+        context_tokens: int = 150,
+        objection_output_tokens: int = 0,
+        feedback_output_tokens: int = 0,
+    ):
+        self._objection = {
+            language: self._objection_template(language, input_tokens, context_tokens, objection_output_tokens)
+            for language in languages
+        }
+        self.feedback = PromptTemplate(
+            "feedback",
+            FEEDBACK_PROMPT_VERSION,
+            system=f"""You are a sales trainer providing concise feedback on practice responses.
+
+                FEEDBACK FORMAT:
+                1. Keep feedback under 150 words
+                2. Be encouraging but honest
+                3. Provide specific, actionable suggestions
+                4. Rate responses 1-10 based on effectiveness
+
+                {FEEDBACK_JSON_CONTRACT}""",
+            user="""Objection: "{objection}"
+                Context: {context}
+                Expected approach: {suggested_response}
+
+                Agent's response: "{user_response}"
+
+                Provide brief, actionable feedback with a score 1-10 as the JSON object described above.""",
+            max_output_tokens=feedback_output_tokens,
+            field_budgets={
+                "objection": context_tokens,
+                "context": context_tokens,
+                "suggested_response": context_tokens,
+                "user_response": input_tokens,
+            },
+        )
+        self._fallback = self._objection.get("English") or self._objection_template(
+            "English", input_tokens, context_tokens, objection_output_tokens
+        )
+
+    def objection(self, language: Optional[str]) -> PromptTemplate:
+        """Coaching template for ``language`` (English when unsupported)"""
+        return self._objection.get(language or "English", self._fallback)
+
+    @staticmethod
+    def _objection_template(language: str, input_tokens: int, context_tokens: int, output_tokens: int) -> PromptTemplate:
+        return PromptTemplate(
+            f"objection.{language}",
+            OBJECTION_PROMPT_VERSION,
+            system=f"""You are a sales coach providing quick, actionable responses to sales objections.
+
+                RESPONSE FORMAT REQUIREMENTS:
+                1. Keep responses under 200 words
+                2. Be direct and practical
+                3. Provide 2-3 specific phrases the agent can use
+                4. {_language_instruction(language)}
+                5. Use simple, clear language
+
+                Structure your response as:
+                **Quick Strategy:** [1-2 sentences]
+                **What to Say:** [2-3 specific phrases]
+                **Why This Works:** [1 sentence explanation]""",
+            user="""Handle this objection: "{objection}"
+
+                Context: {context}
+
+                Give a brief, practical response strategy.""",
+            max_output_tokens=output_tokens,
+            field_budgets={"objection": input_tokens, "context": context_tokens},
+            family="objection",
+        )
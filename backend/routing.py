@@ -0,0 +1,276 @@
+"""Per-request-class model routing with latency-aware hedging.
+
+Each request class (objection coaching, practice scoring) has a route: a primary
+model and an optional secondary. The router keeps a latency EWMA and a window of
+recent latencies for every model. When the primary has not answered by its p95,
+the same prompt goes to the secondary as well (a hedged request). The first
+usable answer wins and the other call is cancelled, which bounds the tail at
+roughly p95 plus the secondary's latency. A primary that fails outright falls
+back to the secondary the same way.
+
+Hedging needs ``min_samples`` latencies of the primary before it starts, and is
+skipped while the LLM client has no spare concurrency, so a loaded upstream is
+not sent twice the work. Streamed replies (``stream``) are not hedged, since
+text already shown can't be swapped for the other model's; they only fall back
+when the primary fails before its first chunk.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from llm import LlmClient, LlmUnavailableError
+
+Model = Tuple[str, str]
+
+
+def parse_models(spec: str) -> List[Model]:
+    """``"gemini/gemini-2.5-flash,gemini/gemini-2.5-flash-lite"`` -> [(provider, model), ...]"""
+    models = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        provider, sep, name = item.partition("/")
+        if not sep or not provider or not name:
+            raise ValueError(f"Model must be given as provider/model, got {item!r}")
+        models.append((provider, name))
+    if not models:
+        raise ValueError("At least one model is required")
+    return models
+
+
+class LatencyTracker:
+    """Latency EWMA plus a window of recent samples for percentiles"""
+
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self.count = 0
+        self._samples: deque = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self._samples.append(seconds)
+        self.ewma = seconds if self.ewma is None else self.alpha * seconds + (1 - self.alpha) * self.ewma
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "samples": self.count,
+            "ewma_seconds": round(self.ewma, 4) if self.ewma is not None else None,
+            "p50_seconds": round(p50, 4) if p50 is not None else None,
+            "p95_seconds": round(p95, 4) if p95 is not None else None,
+        }
+
+
+class ModelRoute:
+    """Primary model of a request class, and the secondary it hedges or falls back to"""
+
+    def __init__(self, primary: Model, secondary: Optional[Model] = None):
+        self.primary = primary
+        self.secondary = secondary if secondary != primary else None
+
+    @classmethod
+    def from_spec(cls, spec: str) -> "ModelRoute":
+        models = parse_models(spec)
+        return cls(models[0], models[1] if len(models) > 1 else None)
+
+    def signature(self) -> str:
+        """Stable name of the route, for version keys"""
+        return ",".join(f"{provider}/{name}" for provider, name in filter(None, [self.primary, self.secondary]))
+
+
+class ModelRouter:
+    """Sends each prompt to its request class's route through the shared ``LlmClient``.
+
+    ``hedge_min_delay`` is a floor on the hedge delay, so a primary with a very
+    tight p95 doesn't trigger a second call for ordinary jitter. ``accept``
+    (per call) decides whether a reply is usable; an unusable reply from the
+    primary also starts the secondary, and is only returned when nothing better
+    arrives.
+    """
+
+    def __init__(
+        self,
+        client: LlmClient,
+        routes: Dict[str, ModelRoute],
+        hedge: bool = True,
+        hedge_min_delay: float = 0.5,
+        min_samples: int = 20,
+        alpha: float = 0.2,
+        window: int = 200,
+        metrics=None,
+    ):
+        self.client = client
+        self.routes = routes
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.metrics = metrics
+        self._alpha = alpha
+        self._window = window
+        self.latency: Dict[str, LatencyTracker] = {}
+        self.hedges = 0
+        self.hedges_skipped = 0
+        self.fallbacks = 0
+        self.secondary_wins = 0
+
+    def route(self, request_class: str) -> ModelRoute:
+        return self.routes[request_class]
+
+    def _tracker(self, model: Model) -> LatencyTracker:
+        tracker = self.latency.get(model[1])
+        if tracker is None:
+            tracker = self.latency[model[1]] = LatencyTracker(self._alpha, self._window)
+        return tracker
+
+    def hedge_delay(self, route: ModelRoute) -> Optional[float]:
+        """Seconds to wait on the primary before hedging (None: don't hedge)"""
+        if not self.hedge or route.secondary is None:
+            return None
+        tracker = self._tracker(route.primary)
+        if tracker.count < self.min_samples:
+            return None
+        return max(self.hedge_min_delay, tracker.percentile(0.95))
+
+    def _has_capacity(self) -> bool:
+        return self.client.queued == 0 and self.client.in_flight < self.client.max_concurrency
+
+    async def _call(self, model: Model, session_prefix: str, system_message: str, text: str, max_output_tokens) -> str:
+        started = time.perf_counter()
+        try:
+            reply = await self.client.send(session_prefix, system_message, model, text, max_output_tokens)
+        except asyncio.CancelledError:
+            # A hedge loser took at least this long; keeping the sample stops a slow
+            # primary from looking fast just because its slow calls were cut short
+            self._tracker(model).observe(time.perf_counter() - started)
+            raise
+        self._tracker(model).observe(time.perf_counter() - started)
+        return reply
+
+    def _count(self, name: str, request_class: str, **labels):
+        if self.metrics is not None:
+            self.metrics.inc(name, request_class=request_class, **labels)
+
+    async def send(
+        self,
+        request_class: str,
+        session_prefix: str,
+        system_message: str,
+        text: str,
+        max_output_tokens: Optional[int] = None,
+        accept: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """Reply to one prompt from the request class's route"""
+        route = self.route(request_class)
+        tasks: Dict[asyncio.Future, Model] = {}
+
+        def start(model: Model) -> asyncio.Future:
+            task = asyncio.ensure_future(self._call(model, session_prefix, system_message, text, max_output_tokens))
+            tasks[task] = model
+            return task
+
+        pending = {start(route.primary)}
+        secondary_started = route.secondary is None
+        # Separate from secondary_started: a hedge skipped for lack of capacity still leaves the failure fallback
+        hedge_decided = secondary_started
+        error: Optional[BaseException] = None
+        unusable: Optional[str] = None
+        try:
+            while pending:
+                timeout = None if hedge_decided else self.hedge_delay(route)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # The primary is past its p95
+                    hedge_decided = True
+                    if self._has_capacity():
+                        secondary_started = True
+                        self.hedges += 1
+                        self._count("llm_hedges_total", request_class)
+                        pending.add(start(route.secondary))
+                    else:
+                        self.hedges_skipped += 1
+                    continue
+
+                for task in done:
+                    model = tasks[task]
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    reply = task.result()
+                    if accept is None or accept(reply):
+                        if model != route.primary:
+                            self.secondary_wins += 1
+                        self._count("llm_route_wins_total", request_class, model=model[1])
+                        return reply
+                    if unusable is None:
+                        unusable = reply
+
+                # Quota and circuit rejections apply to every model, so only real failures fall back
+                if not secondary_started and not isinstance(error, LlmUnavailableError):
+                    secondary_started = hedge_decided = True
+                    self.fallbacks += 1
+                    self._count("llm_fallbacks_total", request_class)
+                    pending.add(start(route.secondary))
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark retrieved; a loser's error is not worth a warning
+
+        if unusable is not None:
+            return unusable
+        raise error
+
+    async def stream(
+        self,
+        request_class: str,
+        session_prefix: str,
+        system_message: str,
+        text: str,
+        max_output_tokens: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """Yield one prompt's reply in chunks from the request class's route"""
+        route = self.route(request_class)
+        models = [route.primary] + ([route.secondary] if route.secondary else [])
+        for model in models:
+            started = time.perf_counter()
+            received = False
+            chunks = self.client.stream(session_prefix, system_message, model, text, max_output_tokens)
+            try:
+                async for chunk in chunks:
+                    received = True
+                    yield chunk
+            except Exception as e:
+                # Quota and circuit rejections apply to every model, so only real failures fall back
+                if received or model is models[-1] or isinstance(e, LlmUnavailableError):
+                    raise
+                self.fallbacks += 1
+                self._count("llm_fallbacks_total", request_class)
+                continue
+            finally:
+                await chunks.aclose()
+            self._tracker(model).observe(time.perf_counter() - started)
+            if model != route.primary:
+                self.secondary_wins += 1
+            self._count("llm_route_wins_total", request_class, model=model[1])
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "routes": {name: route.signature() for name, route in self.routes.items()},
+            "hedging": self.hedge,
+            "hedges": self.hedges,
+            "hedges_skipped": self.hedges_skipped,
+            "fallbacks": self.fallbacks,
+            "secondary_wins": self.secondary_wins,
+            "models": {name: tracker.stats() for name, tracker in self.latency.items()},
+        }
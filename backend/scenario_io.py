@@ -0,0 +1,483 @@
+"""Bulk import and export of the scenario catalog as CSV or JSONL.
+
+Imports read their input as a stream of byte chunks. Each row is validated
+against the ``Scenario`` model as it arrives and written to MongoDB in
+unordered ``bulk_write`` batches that upsert on ``id``. Only the batch being
+built and the batch being written are held in memory, so a file of tens of
+thousands of scenarios costs the same memory as a file of a hundred. Invalid
+rows are counted and reported with their line numbers (the first
+``max_errors`` of them); they never stop the import.
+
+Exports stream the collection through a cursor in ``id`` order.
+
+Run from ``backend/`` (scenarios go to the server's MongoDB; running servers
+pick them up on POST /api/scenarios/reload):
+
+    python scenario_io.py import objections.csv
+    python scenario_io.py import library.jsonl --replace
+    python scenario_io.py export catalog.jsonl --category "Pricing Objections"
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("id", "category", "objection", "context", "suggested_response")
+FORMATS = ("jsonl", "csv")
+
+# A single row longer than this is rejected rather than buffered without bound
+MAX_ROW_BYTES = 256 * 1024
+
+# (line number, raw row or None, error or None)
+Record = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+class ImportFormatError(ValueError):
+    """The input as a whole can't be read (bad header, oversized row, bad encoding)"""
+
+
+class ImportConflictError(RuntimeError):
+    """Another replace import holds the catalog"""
+
+
+class ImportLock:
+    """Lease on the catalog for one replace import at a time, across workers and the CLI.
+
+    The lease is one document ``{_id, owner, lease_until}`` in ``collection``.
+    Its holder renews it after every batch. A lease left by a crashed import
+    expires after ``lease_seconds`` and can then be taken over.
+    """
+
+    def __init__(self, collection, lease_seconds: float = 300, name: str = "scenario_replace"):
+        self.collection = collection
+        self.lease_seconds = lease_seconds
+        self.name = name
+
+    def _lease_until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    async def acquire(self, owner: str):
+        try:
+            await self.collection.insert_one({"_id": self.name, "owner": owner, "lease_until": self._lease_until()})
+            return
+        except DuplicateKeyError:
+            pass
+        result = await self.collection.update_one(
+            {"_id": self.name, "lease_until": {"$lt": datetime.utcnow()}},
+            {"$set": {"owner": owner, "lease_until": self._lease_until()}},
+        )
+        if not result.modified_count:
+            doc = await self.collection.find_one({"_id": self.name}) or {}
+            raise ImportConflictError(f"Replace import {doc.get('owner', '?')} is still running; retry once it has finished")
+
+    async def renew(self, owner: str) -> bool:
+        """Extend the lease; False when ``owner`` no longer holds it"""
+        result = await self.collection.update_one(
+            {"_id": self.name, "owner": owner},
+            {"$set": {"lease_until": self._lease_until()}},
+        )
+        return bool(result.matched_count)
+
+    async def release(self, owner: str):
+        await self.collection.delete_one({"_id": self.name, "owner": owner})
+
+
+def guess_format(filename: str = "", content_type: str = "") -> str:
+    """``csv`` for .csv files or text/csv bodies, ``jsonl`` otherwise"""
+    if filename.lower().endswith(".csv") or content_type.split(";")[0].strip() in ("text/csv", "application/csv"):
+        return "csv"
+    return "jsonl"
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Decoded lines (with their line endings) of a chunked UTF-8 stream"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    try:
+        async for chunk in chunks:
+            pending += decoder.decode(chunk)
+            start = 0
+            while True:
+                end = pending.find("\n", start)
+                if end < 0:
+                    break
+                yield pending[start:end + 1]
+                start = end + 1
+            pending = pending[start:]
+            if len(pending) > MAX_ROW_BYTES:
+                raise ImportFormatError(f"Line longer than {MAX_ROW_BYTES} bytes")
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise ImportFormatError(f"Input is not valid UTF-8: {e}")
+    if pending:
+        yield pending
+
+
+async def iter_jsonl_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Record]:
+    """One record per non-blank line, each a JSON object"""
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, row, None
+
+
+async def iter_csv_records(chunks: AsyncIterable[bytes]) -> AsyncIterator[Record]:
+    """Rows of a CSV file with a header line; quoted fields may span lines"""
+    header: Optional[List[str]] = None
+    line_no = 0
+    row_start = 0
+    parts: List[str] = []
+    size = 0
+    in_quotes = False
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not parts:
+            row_start = line_no
+        parts.append(line)
+        size += len(line)
+        # An odd number of quotes leaves a quoted field open on the next line
+        if line.count('"') % 2:
+            in_quotes = not in_quotes
+        if in_quotes:
+            if size > MAX_ROW_BYTES:
+                raise ImportFormatError(f"Row starting on line {row_start} is longer than {MAX_ROW_BYTES} bytes")
+            continue
+        text = "".join(parts)
+        parts, size = [], 0
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader(io.StringIO(text)))
+        except csv.Error as e:
+            yield row_start, None, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            missing = [field for field in FIELDS if field not in header]
+            if missing:
+                raise ImportFormatError(f"CSV header is missing column(s): {', '.join(missing)}")
+            continue
+        if len(values) != len(header):
+            yield row_start, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_start, dict(zip(header, values)), None
+    if parts:
+        yield row_start, None, "Unterminated quoted field at end of input"
+
+
+def _validation_message(error: Exception) -> str:
+    """``field: message`` for each problem of a pydantic ValidationError"""
+    if not callable(getattr(error, "errors", None)):
+        return str(error)
+    return "; ".join(
+        f"{'.'.join(str(part) for part in problem['loc']) or 'row'}: {problem['msg']}" for problem in error.errors()
+    )
+
+
+def iter_records(chunks: AsyncIterable[bytes], fmt: str) -> AsyncIterator[Record]:
+    if fmt == "csv":
+        return iter_csv_records(chunks)
+    if fmt == "jsonl":
+        return iter_jsonl_records(chunks)
+    raise ImportFormatError(f"Unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+
+
+class ScenarioImport:
+    """One import run: validates records, writes them in batches and tracks progress.
+
+    In the default merge mode, rows upsert on ``id`` and other scenarios stay.
+    When the collection is still empty, ``seed`` is written first, so that
+    importing a customer library adds to the built-in catalog instead of hiding
+    it; those rows are reported as ``seeded``, not ``inserted``. With ``replace``
+    every written document is tagged with this import's id and, once the whole
+    input was valid and not empty, documents from earlier imports are deleted.
+    Replace imports hold ``lock`` while they run, so two of them can't delete
+    each other's rows; a second one fails with ImportConflictError. ``dry_run``
+    validates without writing.
+    """
+
+    def __init__(
+        self,
+        collection,
+        model,
+        batch_size: int = 1000,
+        replace: bool = False,
+        dry_run: bool = False,
+        seed: Iterable[dict] = (),
+        lock: Optional[ImportLock] = None,
+        max_errors: int = 100,
+        progress_every: int = 5000,
+    ):
+        self.collection = collection
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.replace = replace
+        self.dry_run = dry_run
+        self.seed = seed
+        self.lock = lock if replace and not dry_run else None
+        self.max_errors = max_errors
+        self.progress_every = progress_every
+        self.id = uuid.uuid4().hex[:12]
+        self.status = "running"
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self.rows = 0
+        self.seeded = 0
+        self.valid = 0
+        self.invalid = 0
+        self.upserted = 0
+        self.modified = 0
+        self.write_errors = 0
+        self.deleted = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.detail: Optional[str] = None
+        self._started = time.monotonic()
+
+    def _error(self, line: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+
+    def _operation(self, scenario: dict) -> ReplaceOne:
+        doc = dict(scenario, import_id=self.id)
+        return ReplaceOne({"id": scenario["id"]}, doc, upsert=True)
+
+    async def _write(self, operations: List[ReplaceOne]):
+        if self.lock is not None:
+            await self.lock.renew(self.id)
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+            self.upserted += result.upserted_count
+            self.modified += result.matched_count
+        except BulkWriteError as e:
+            # Unordered: everything but the failed operations was applied
+            details = e.details
+            self.upserted += details.get("nUpserted", 0)
+            self.modified += details.get("nMatched", 0)
+            for error in details.get("writeErrors", []):
+                self.write_errors += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append({"id": error["op"].get("q", {}).get("id"), "error": error.get("errmsg")})
+
+    async def _write_seed(self):
+        if self.dry_run or self.replace or not self.seed:
+            return
+        if await self.collection.count_documents({}, limit=1):
+            return
+        operations = [self._operation(self.model(**raw).model_dump()) for raw in self.seed]
+        result = await self.collection.bulk_write(operations, ordered=False)
+        self.seeded = result.upserted_count
+        logger.info(f"Import {self.id}: empty collection, wrote {self.seeded} seed scenarios first")
+
+    async def run(self, records: AsyncIterable[Record]) -> Dict[str, Any]:
+        """Consume ``records`` and return the final report"""
+        writing: Optional[asyncio.Task] = None
+        batch: List[ReplaceOne] = []
+        locked = False
+        try:
+            if self.lock is not None:
+                await self.lock.acquire(self.id)
+                locked = True
+            await self._write_seed()
+            async for line, raw, error in records:
+                self.rows += 1
+                if error is None:
+                    try:
+                        scenario = self.model(**raw).model_dump()
+                    except Exception as e:
+                        error = _validation_message(e)
+                if error is not None:
+                    self._error(line, error)
+                else:
+                    self.valid += 1
+                    if not self.dry_run:
+                        batch.append(self._operation(scenario))
+                if len(batch) >= self.batch_size:
+                    # Parse the next batch while this one is written
+                    if writing is not None:
+                        await writing
+                    writing = asyncio.ensure_future(self._write(batch))
+                    batch = []
+                if self.rows % self.progress_every == 0:
+                    logger.info(f"Import {self.id}: {self.progress()}")
+            if writing is not None:
+                await writing
+            if batch:
+                await self._write(batch)
+            if self.replace and not self.dry_run:
+                if self.invalid or self.write_errors:
+                    self.detail = "Some rows failed, so scenarios from earlier imports were kept"
+                elif not self.valid:
+                    # An empty or header-only file must not wipe the catalog
+                    self.detail = "No scenarios in the input, so scenarios from earlier imports were kept"
+                else:
+                    if self.lock is not None and not await self.lock.renew(self.id):
+                        raise ImportConflictError("The replace lock expired during the import, so no scenarios were deleted")
+                    result = await self.collection.delete_many({"import_id": {"$ne": self.id}})
+                    self.deleted = result.deleted_count
+            self.status = "completed"
+        except Exception as e:
+            self.status = "failed"
+            self.detail = str(e)
+            raise
+        finally:
+            if writing is not None and not writing.done():
+                writing.cancel()
+            if locked:
+                await self.lock.release(self.id)
+            self.finished_at = datetime.now(timezone.utc)
+            logger.info(f"Import {self.id} {self.status}: {self.progress()}")
+        return self.report()
+
+    def progress(self) -> str:
+        rate = self.rows / max(time.monotonic() - self._started, 1e-6)
+        return (
+            f"{self.rows} rows ({self.valid} valid, {self.invalid} invalid), "
+            f"{self.upserted} inserted, {self.modified} updated, {rate:.0f} rows/s"
+        )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "dry_run": self.dry_run,
+            "mode": "replace" if self.replace else "merge",
+            "rows": self.rows,
+            "valid": self.valid,
+            "invalid": self.invalid,
+            "seeded": self.seeded,
+            "inserted": self.upserted,
+            "updated": self.modified,
+            "write_errors": self.write_errors,
+            "deleted": self.deleted,
+            "errors": self.errors,
+            "detail": self.detail,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+async def iter_collection(collection, category: Optional[str] = None, batch_size: int = 1000) -> AsyncIterator[dict]:
+    """Scenarios of the collection in ``id`` order, fetched ``batch_size`` at a time"""
+    query = {"category": category} if category else {}
+    projection = {field: 1 for field in FIELDS}
+    projection["_id"] = 0
+    async for doc in collection.find(query, projection).sort("id", 1).batch_size(batch_size):
+        yield doc
+
+
+async def encode_scenarios(scenarios: AsyncIterable[dict], fmt: str, rows_per_chunk: int = 500) -> AsyncIterator[bytes]:
+    """CSV (with header) or JSONL bytes for a stream of scenarios, ``rows_per_chunk`` rows per chunk"""
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(FIELDS)
+    rows = 0
+    async for scenario in scenarios:
+        if fmt == "csv":
+            writer.writerow([scenario.get(field, "") for field in FIELDS])
+        else:
+            buffer.write(json.dumps({field: scenario.get(field) for field in FIELDS}, ensure_ascii=False))
+            buffer.write("\n")
+        rows += 1
+        if rows % rows_per_chunk == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def _read_chunks(stream, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await asyncio.to_thread(stream.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _main(args):
+    import server
+
+    collection = server.db.scenarios
+    try:
+        if args.command == "import":
+            fmt = args.format or guess_format(args.file)
+            job = ScenarioImport(
+                collection,
+                server.Scenario,
+                batch_size=args.batch_size,
+                replace=args.replace,
+                dry_run=args.dry_run,
+                seed=server.DEMO_SCENARIOS,
+                lock=server.scenario_import_lock,
+                progress_every=args.progress_every,
+            )
+            await server.scenario_store.ensure_indexes()
+            stream = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+            try:
+                report = await job.run(iter_records(_read_chunks(stream), fmt))
+            finally:
+                if stream is not sys.stdin.buffer:
+                    stream.close()
+            print(json.dumps(report, indent=2, default=str))
+            return 1 if report["invalid"] or report["write_errors"] else 0
+
+        fmt = args.format or guess_format(args.file)
+        out = sys.stdout.buffer if args.file == "-" else open(args.file, "wb")
+        try:
+            async for chunk in encode_scenarios(iter_collection(collection, args.category), fmt):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+        return 0
+    finally:
+        server.client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("import", help="validate a CSV/JSONL file and upsert it into MongoDB")
+    load.add_argument("file", help="input file, or - for stdin")
+    load.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    load.add_argument("--batch-size", type=int, default=1000, help="rows per bulk write")
+    load.add_argument("--replace", action="store_true", help="delete scenarios that are not in this file")
+    load.add_argument("--dry-run", action="store_true", help="validate only")
+    load.add_argument("--progress-every", type=int, default=5000, help="log progress every N rows")
+    dump = commands.add_parser("export", help="stream the scenario collection to a CSV/JSONL file")
+    dump.add_argument("file", help="output file, or - for stdout")
+    dump.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    dump.add_argument("--category", help="only this category")
+    args = parser.parse_args(argv)
+    return asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class ScenarioStore:
+    """Indexed, pre-serialized catalog of practice scenarios.
+
+    Scenarios are validated once when loaded, then kept as plain dicts indexed by
+    id and by category, alongside their JSON encodings so the read endpoints can
+    splice response bodies together without touching pydantic. ``reload`` swaps
+    in a fresh catalog from MongoDB (falling back to the seed list when the
+    collection is empty); readers never see a half-built index.
+    """
+
+    def __init__(self, model, seed: Sequence[dict], collection=None):
+        self.model = model
+        self.seed = list(seed)
+        self.collection = collection
+        self.source = "seed"
+        self._build(self.seed)
+
+    def _build(self, raw_scenarios: Sequence[dict]):
+        scenarios = []
+        for raw in raw_scenarios:
+            try:
+                scenarios.append(self.model(**raw).model_dump())
+            except Exception as e:
+                logger.warning(f"Skipping invalid scenario {raw.get('id')!r}: {e}")
+        scenarios.sort(key=lambda s: s["id"])
+
+        by_id: Dict[int, dict] = {}
+        position_by_id: Dict[int, int] = {}
+        by_category: Dict[str, List[int]] = {}
+        encoded: List[str] = []
+        for position, scenario in enumerate(scenarios):
+            by_id[scenario["id"]] = scenario
+            position_by_id[scenario["id"]] = position
+            by_category.setdefault(scenario["category"], []).append(position)
+            encoded.append(json.dumps(scenario, ensure_ascii=False))
+
+        all_json = "[" + ",".join(encoded) + "]"
+        categories = list(by_category)
+
+        # Swap everything in at once
+        self._scenarios = scenarios
+        self._by_id = by_id
+        self._position_by_id = position_by_id
+        self._by_category = by_category
+        self._encoded = encoded
+        self._categories = categories
+        self._all_json = all_json.encode("utf-8")
+        self._categories_json = json.dumps({"categories": categories}, ensure_ascii=False).encode("utf-8")
+        self.etag = '"' + hashlib.sha1(self._all_json).hexdigest() + '"'
+
+    async def ensure_indexes(self):
+        """Unique ``id`` index, which bulk imports upsert on and exports sort by"""
+        if self.collection is None:
+            return
+        try:
+            await self.collection.create_index("id", unique=True)
+        except Exception as e:
+            logger.warning(f"Could not create scenario indexes: {e}")
+
+    async def reload(self) -> int:
+        """Reload the catalog from MongoDB; returns the number of scenarios loaded"""
+        docs = []
+        if self.collection is not None:
+            try:
+                docs = await self.collection.find({}, {"_id": 0}).to_list(length=None)
+            except Exception as e:
+                logger.warning(f"Could not load scenarios from MongoDB, keeping current catalog: {e}")
+                return len(self._scenarios)
+        if docs:
+            self._build(docs)
+            self.source = "mongo"
+        else:
+            self._build(self.seed)
+            self.source = "seed"
+        logger.info(f"Loaded {len(self._scenarios)} scenarios from {self.source}")
+        return len(self._scenarios)
+
+    def __len__(self) -> int:
+        return len(self._scenarios)
+
+    def get(self, scenario_id: int) -> Optional[dict]:
+        return self._by_id.get(scenario_id)
+
+    def position(self, scenario_id: int) -> Optional[int]:
+        return self._position_by_id.get(scenario_id)
+
+    def all(self) -> List[dict]:
+        return self._scenarios
+
+    @property
+    def categories(self) -> List[str]:
+        return self._categories
+
+    def count(self, category: Optional[str] = None) -> int:
+        if category is None:
+            return len(self._scenarios)
+        return len(self._by_category.get(category, ()))
+
+    def positions(self, category: Optional[str] = None) -> Sequence[int]:
+        """Catalog positions of all scenarios, or of one category"""
+        if category is None:
+            return range(len(self._scenarios))
+        return self._by_category.get(category, [])
+
+    def all_json(self) -> bytes:
+        return self._all_json
+
+    def categories_json(self) -> bytes:
+        return self._categories_json
+
+    def page_json(self, category: Optional[str] = None, skip: int = 0, limit: Optional[int] = None) -> bytes:
+        """JSON array for one page of the (optionally category-filtered) catalog"""
+        if category is None and skip == 0 and limit is None:
+            return self._all_json
+        positions = self.positions(category)
+        end = None if limit is None else skip + limit
+        return self.join_json(positions[skip:end])
+
+    def join_json(self, positions) -> bytes:
+        """JSON array of the scenarios at the given catalog positions"""
+        return ("[" + ",".join(self._encoded[p] for p in positions) + "]").encode("utf-8")
+
+
+class CatalogVersion:
+    """Version stamp of the scenario catalog, kept in the shared state backend.
+
+    A worker that changes the catalog (bulk import, reload) ``publish``-es a new
+    version; the others notice it in ``follow_catalog`` and reload too. With the
+    local backend each worker only sees its own stamp, so this is a no-op.
+    """
+
+    KEY = "scenarios"
+    # The stamp only needs to outlive the gap between two catalog changes
+    TTL_SECONDS = 365 * 24 * 3600
+
+    def __init__(self, store):
+        self.store = store
+        self.current: Optional[str] = None
+
+    async def publish(self):
+        self.current = uuid.uuid4().hex
+        await self.store.set(self.KEY, {"version": self.current}, self.TTL_SECONDS)
+
+    async def changed(self) -> bool:
+        """True (once) when another worker published a version this one hasn't loaded"""
+        entry = await self.store.get(self.KEY)
+        version = entry.get("version") if entry else None
+        if version is None or version == self.current:
+            return False
+        self.current = version
+        return True
+
+
+async def follow_catalog(version: CatalogVersion, reload: Callable[[], Awaitable[int]], interval: float):
+    """Background task: reload the catalog whenever another worker publishes a new version"""
+    # The catalog loaded at startup is already current
+    await version.changed()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await version.changed():
+                count = await reload()
+                logger.info(f"Catalog changed on another worker, reloaded {count} scenarios")
+        except Exception as e:
+            logger.warning(f"Catalog version check failed: {e}")
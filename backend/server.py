@@ -1,27 +1,173 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+import time
+_IMPORT_STARTED = time.perf_counter()  # cold-start accounting, reported by /api/health/ready
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+import random
+from collections import deque
 from pathlib import Path
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
-from typing import List, Optional
-import uuid
-from datetime import datetime
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
 import json
+from cache import ResponseCache, make_objection_key, make_scenario_key, normalize_text
+from feedback_parser import (
+    FeedbackParseError,
+    FeedbackStreamParser,
+    parse_feedback_reply,
+    parse_markdown_feedback,
+    render_feedback,
+    repair_prompt,
+)
+from history import PERIOD_FORMATS, PracticeHistory
+from jobs import JobFailed, JobQueue
+from llm import CircuitBreaker, LlmClient, LlmUnavailableError
+from matching import ScenarioMatcher
+from metrics import MetricsMiddleware, MetricsRegistry
+from practice import PracticeSelector
+from pregenerate import PrecomputedStore, prompt_hash, refresh_forever
+from prompts import PromptCatalog, PromptTemplate, estimate_tokens
+from routing import ModelRoute, ModelRouter
+from scenario_io import (
+    FORMATS,
+    ImportConflictError,
+    ImportFormatError,
+    ImportLock,
+    ScenarioImport,
+    encode_scenarios,
+    guess_format,
+    iter_collection,
+    iter_records,
+)
+from scenarios import CatalogVersion, ScenarioStore, follow_catalog
+from shared import TokenBucketLimiter, create_state_backend
+from singleflight import SingleFlight
+from stt import AudioFormatError, AudioTooLongError, SpeechTranscriber, SttUnavailableError
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+if mongo_url.startswith('mongomock://'):
+    # In-memory MongoDB for benchmarks and local runs (needs mongomock-motor)
+    from mongomock_motor import AsyncMongoMockClient
+    client = AsyncMongoMockClient()
+else:
+    client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
-# Create the main app without a prefix
-app = FastAPI()
+# State shared by all worker processes: "mongo" for multi-worker deployments, "local" keeps it in-process
+shared_state = create_state_backend(os.environ.get('SHARED_STATE_BACKEND', 'mongo'), db)
+
+# Cache for generated objection responses (memory LRU + optional shared tier)
+objection_cache = ResponseCache(
+    max_entries=int(os.environ.get('OBJECTION_CACHE_SIZE', '1024')),
+    ttl_seconds=int(os.environ.get('OBJECTION_CACHE_TTL', '86400')),
+    store=shared_state.key_value("objection_cache") if os.environ.get('OBJECTION_CACHE_SHARED', 'true').lower() == 'true' else None,
+)
+
+# Seconds between keep-alive comments while a streamed reply is pending
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '5'))
+
+# Model routes as "provider/primary,provider/secondary": a fast model for coaching, the strong one for scoring.
+# The secondary is hedged to when the primary passes its p95, and tried when the primary fails.
+OBJECTION_MODELS = os.environ.get('OBJECTION_MODELS', 'gemini/gemini-2.5-flash,gemini/gemini-2.5-flash-lite')
+FEEDBACK_MODELS = os.environ.get('FEEDBACK_MODELS', 'gemini/gemini-2.5-pro,gemini/gemini-2.5-flash')
+
+# Re-prompts allowed when a feedback reply doesn't match the JSON contract
+FEEDBACK_REPAIR_ATTEMPTS = int(os.environ.get('FEEDBACK_REPAIR_ATTEMPTS', '1'))
+
+# Coalesces identical in-flight objection requests (keyed like the cache)
+objection_flights = SingleFlight()
+
+# Request, stage and LLM metrics, exposed at /api/metrics
+metrics = MetricsRegistry()
+metrics.describe("http_request_duration_seconds", "histogram", "Request latency by route, including streamed bodies")
+metrics.describe("stage_duration_seconds", "histogram", "Time spent in each stage of the AI endpoints")
+metrics.describe("llm_request_duration_seconds", "histogram", "Successful upstream model call latency")
+metrics.describe("handler_errors_total", "counter", "Errors raised inside AI handlers, by exception class")
+metrics.describe("feedback_repairs_total", "counter", "Feedback re-prompts after a reply failed JSON validation")
+metrics.describe("feedback_parse_failures_total", "counter", "Feedback replies that never validated and fell back to text")
+metrics.describe("llm_hedges_total", "counter", "Hedged requests sent to the secondary model after the primary's p95")
+metrics.describe("llm_fallbacks_total", "counter", "Requests retried on the secondary model after the primary failed")
+metrics.describe("llm_route_wins_total", "counter", "Replies used, by request class and the model that produced them")
+
+# Upstream calls per second allowed across all workers (0 disables the global limit)
+LLM_RATE_LIMIT = float(os.environ.get('LLM_RATE_LIMIT', '0'))
+LLM_RATE_BURST = float(os.environ.get('LLM_RATE_BURST', '0'))
+
+# Shared gateway for all model calls: bounded concurrency, retries and a circuit breaker
+llm_client = LlmClient(
+    api_key=os.environ.get('GEMINI_API_KEY'),
+    max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', '16')),
+    queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT', '10')),
+    call_timeout=float(os.environ.get('LLM_CALL_TIMEOUT', '60')),
+    max_retries=int(os.environ.get('LLM_MAX_RETRIES', '2')),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('LLM_BREAKER_THRESHOLD', '5')),
+        reset_timeout=float(os.environ.get('LLM_BREAKER_RESET', '30')),
+    ),
+    metrics=metrics,
+    provider=os.environ.get('LLM_PROVIDER', 'emergent'),
+    rate_limiter=TokenBucketLimiter(
+        shared_state, "llm_calls", rate=LLM_RATE_LIMIT, burst=LLM_RATE_BURST or None,
+    ) if LLM_RATE_LIMIT > 0 else None,
+)
+
+# Picks the model per request class, hedging slow primaries (LLM_HEDGE=false turns hedging off)
+model_router = ModelRouter(
+    llm_client,
+    {
+        "objection": ModelRoute.from_spec(OBJECTION_MODELS),
+        "feedback": ModelRoute.from_spec(FEEDBACK_MODELS),
+    },
+    hedge=os.environ.get('LLM_HEDGE', 'true').lower() == 'true',
+    hedge_min_delay=float(os.environ.get('LLM_HEDGE_MIN_DELAY', '0.5')),
+    min_samples=int(os.environ.get('LLM_HEDGE_MIN_SAMPLES', '20')),
+    metrics=metrics,
+)
+
+# Languages offered by the frontend
+SUPPORTED_LANGUAGES = ["English", "Hindi", "Hinglish", "Marathi", "Kannada", "Tamil", "Telugu", "Bangla"]
+
+# Prompt templates, compiled per language; token budgets for the agent's text and each piece of scenario context
+# Output limits follow the "under 200/150 words" contracts (0 leaves the model default). With thinking models
+# such as gemini-2.5-pro the limit also counts reasoning tokens, so keep headroom above the word count.
+prompt_catalog = PromptCatalog(
+    SUPPORTED_LANGUAGES,
+    input_tokens=int(os.environ.get('PROMPT_INPUT_TOKENS', '300')),
+    context_tokens=int(os.environ.get('PROMPT_CONTEXT_TOKENS', '150')),
+    objection_output_tokens=int(os.environ.get('OBJECTION_MAX_OUTPUT_TOKENS', '2048')),
+    feedback_output_tokens=int(os.environ.get('FEEDBACK_MAX_OUTPUT_TOKENS', '1536')),
+)
+
+# Background refresh of pre-generated responses (off unless an interval is set)
+PRECOMPUTE_REFRESH_SECONDS = float(os.environ.get('PRECOMPUTE_REFRESH_SECONDS', '0'))
+PRECOMPUTE_MAX_AGE_DAYS = float(os.environ.get('PRECOMPUTE_MAX_AGE_DAYS', '0'))
+
+# Batch objection handling limits
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '100'))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', '16'))
+BATCH_ITEM_TIMEOUT = float(os.environ.get('BATCH_ITEM_TIMEOUT', '60'))
+
+# Server-side transcription of voice answers (engine runs in a process pool)
+speech_transcriber = SpeechTranscriber(
+    engine=os.environ.get('STT_ENGINE', 'whisper'),
+    model=os.environ.get('STT_MODEL', 'small'),
+    workers=int(os.environ.get('STT_WORKERS', '2')),
+    max_seconds=float(os.environ.get('STT_MAX_SECONDS', '120')),
+    threshold=float(os.environ.get('STT_VAD_THRESHOLD', '500')),
+)
+
+# Longest long-poll on GET /api/jobs/{id}
+JOB_WAIT_MAX_SECONDS = float(os.environ.get('JOB_WAIT_MAX_SECONDS', '30'))
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -107,6 +253,7 @@ class PracticeResponse(BaseModel):
     scenario_id: int
     user_response: str
     response_type: str  # "voice" or "text"
+    agent_id: Optional[str] = None
 
 class AIResponse(BaseModel):
     response: str
@@ -117,164 +264,980 @@ class PracticeFeedback(BaseModel):
     score: Optional[int] = None
     suggestions: List[str] = []
 
+class BatchObjectionRequest(BaseModel):
+    items: List[ObjectionRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: Optional[int] = Field(None, ge=1)
+    stream: bool = False
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[AIResponse] = None
+    error: Optional[str] = None
+
+class BatchObjectionResponse(BaseModel):
+    results: List[BatchItemResult]
+
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    status: str
+    attempts: int
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+# Scenario catalog: indexed and pre-serialized, loaded from MongoDB at startup
+scenario_store = ScenarioStore(Scenario, DEMO_SCENARIOS, collection=db.scenarios)
+
+# Nearest-scenario lookup for free-text objections, rebuilt whenever the catalog loads
+scenario_matcher = ScenarioMatcher()
+# Calibrated on English/Hinglish paraphrases of the demo catalog vs. off-topic text:
+# paraphrases mostly score 0.3-0.7 and off-topic text stays below 0.3
+SCENARIO_MATCH_MIN_SCORE = float(os.environ.get('SCENARIO_MATCH_MIN_SCORE', '0.3'))
+
+# Practice attempts, written behind the request path in batches
+practice_history = PracticeHistory(
+    db.practice_attempts,
+    batch_size=int(os.environ.get('HISTORY_BATCH_SIZE', '200')),
+    flush_interval=float(os.environ.get('HISTORY_FLUSH_SECONDS', '1')),
+)
+
+# Spaced-repetition practice picks from each agent's history, cached per agent
+practice_selector = PracticeSelector(
+    db.practice_attempts,
+    scenario_store,
+    max_agents=int(os.environ.get('PRACTICE_STATE_CACHE_SIZE', '10000')),
+    state_ttl=float(os.environ.get('PRACTICE_STATE_TTL', '300')),
+    base_interval=float(os.environ.get('PRACTICE_BASE_INTERVAL_HOURS', '24')) * 3600,
+)
+
+# Coaching responses pre-generated offline by pregenerate.py
+precomputed_store = PrecomputedStore(db.precomputed_responses, lambda scenario, language: _objection_prompt_hash(scenario, language))
+
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "Sales Training Assistant API"}
 
+def _json_response(request: Request, body: bytes, **headers) -> Response:
+    """Serve a pre-serialized catalog body, honouring If-None-Match"""
+    headers["ETag"] = scenario_store.etag
+    if request.headers.get("if-none-match") == scenario_store.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @api_router.get("/scenarios", response_model=List[Scenario])
-async def get_all_scenarios():
-    """Get all 60 demo scenarios"""
-    return [Scenario(**scenario) for scenario in DEMO_SCENARIOS]
+async def get_all_scenarios(
+    request: Request,
+    category: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+):
+    """Get all scenarios, optionally filtered by category and paginated"""
+    return _json_response(
+        request,
+        scenario_store.page_json(category, skip, limit),
+        **{"X-Total-Count": str(scenario_store.count(category))}
+    )
 
 @api_router.get("/scenarios/categories")
-async def get_scenario_categories():
-    """Get unique categories of scenarios"""
-    categories = list(set([scenario["category"] for scenario in DEMO_SCENARIOS]))
-    return {"categories": categories}
-
-@api_router.get("/scenarios/practice")
-async def get_practice_scenarios():
-    """Get 10 random scenarios for practice mode"""
-    import random
-    practice_scenarios = random.sample(DEMO_SCENARIOS, 10)
-    return [Scenario(**scenario) for scenario in practice_scenarios]
+async def get_scenario_categories(request: Request):
+    """Get unique categories of scenarios, in catalog order"""
+    return _json_response(request, scenario_store.categories_json())
+
+@api_router.get("/scenarios/practice", response_model=List[Scenario])
+async def get_practice_scenarios(category: Optional[str] = None, agent_id: Optional[str] = None):
+    """Get 10 scenarios for practice mode, picked for the agent's weak and due scenarios when known"""
+    if agent_id:
+        practice_positions = await practice_selector.select(agent_id, 10, category)
+    else:
+        positions = scenario_store.positions(category)
+        practice_positions = random.sample(positions, min(10, len(positions)))
+    return Response(content=scenario_store.join_json(practice_positions), media_type="application/json")
+
+@api_router.post("/scenarios/reload")
+async def reload_scenarios():
+    """Reload the scenario catalog from MongoDB without restarting"""
+    count = await _load_catalog()
+    await catalog_version.publish()
+    return {"scenarios": count, "source": scenario_store.source, "etag": scenario_store.etag}
+
+@api_router.get("/scenarios/match")
+async def match_scenarios(q: str, k: int = Query(3, ge=1, le=20)):
+    """Find the curated scenarios closest to a free-text objection"""
+    return [
+        {"scenario": scenario, "score": round(score, 4)}
+        for scenario, score in scenario_matcher.match(q, k)
+    ]
+
+# Seconds between checks for catalog changes made by other workers (0 disables)
+CATALOG_POLL_SECONDS = float(os.environ.get('CATALOG_POLL_SECONDS', '10'))
+catalog_version = CatalogVersion(shared_state.key_value("catalog_versions"))
+
+# Recent bulk imports of this worker, newest last, for progress polling
+scenario_imports: deque = deque(maxlen=20)
+SCENARIO_FORMAT_PATTERN = f"^({'|'.join(FORMATS)})$"
+
+# Lease of a running replace import (renewed every batch); a crashed import's lease expires after this
+SCENARIO_IMPORT_LEASE_SECONDS = float(os.environ.get('SCENARIO_IMPORT_LEASE_SECONDS', '300'))
+scenario_import_lock = ImportLock(db.scenario_import_locks, SCENARIO_IMPORT_LEASE_SECONDS)
+
+@api_router.post("/scenarios/import")
+async def import_scenarios(
+    request: Request,
+    format: Optional[str] = Query(None, pattern=SCENARIO_FORMAT_PATTERN),
+    mode: str = Query("merge", pattern="^(merge|replace)$"),
+    dry_run: bool = False,
+    batch_size: int = Query(1000, ge=1, le=10000),
+):
+    """Stream a CSV or JSONL scenario file into MongoDB, validating each row, then reload the catalog
+
+    ``format`` defaults to csv for ``text/csv`` bodies and jsonl otherwise. Rows
+    upsert on ``id``; ``mode=replace`` also removes scenarios not in the file.
+    Only one replace import runs at a time across workers; another one gets 409.
+    Progress of a running import is visible at GET /api/scenarios/imports.
+    """
+    job = ScenarioImport(
+        db.scenarios,
+        Scenario,
+        batch_size=batch_size,
+        replace=mode == "replace",
+        dry_run=dry_run,
+        seed=DEMO_SCENARIOS,
+        lock=scenario_import_lock,
+    )
+    scenario_imports.append(job)
+    fmt = format or guess_format(content_type=request.headers.get("content-type", ""))
+    try:
+        with metrics.timer("stage_duration_seconds", endpoint="scenario_import", stage="import"):
+            report = await job.run(iter_records(request.stream(), fmt))
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        _record_error("scenario_import", e)
+        raise HTTPException(status_code=500, detail=f"Scenario import failed: {str(e)}")
+    if not dry_run:
+        report["scenarios"] = await _load_catalog()
+        await catalog_version.publish()
+    return report
+
+@api_router.get("/scenarios/imports")
+async def list_scenario_imports():
+    """Progress and results of this worker's recent imports, newest first"""
+    return [job.report() for job in reversed(scenario_imports)]
+
+@api_router.get("/scenarios/export")
+async def export_scenarios(
+    format: str = Query("jsonl", pattern=SCENARIO_FORMAT_PATTERN),
+    category: Optional[str] = None,
+):
+    """Stream the scenario catalog as CSV or JSONL, straight from a MongoDB cursor"""
+    if scenario_store.source == "mongo":
+        scenarios = iter_collection(db.scenarios, category)
+    else:
+        # Nothing imported yet: the built-in catalog is already in memory
+        async def seed_scenarios():
+            for position in scenario_store.positions(category):
+                yield scenario_store.all()[position]
+        scenarios = seed_scenarios()
+    return StreamingResponse(
+        encode_scenarios(scenarios, format),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="scenarios.{format}"'},
+    )
+
+async def _load_catalog() -> int:
+    """(Re)load the scenario store and rebuild the indexes derived from it"""
+    count = await scenario_store.reload()
+    scenario_matcher.build(scenario_store.all())
+    return count
+
+def _find_scenario(scenario_id: Optional[int]) -> Optional[dict]:
+    """Look up a scenario by id"""
+    if not scenario_id:
+        return None
+    return scenario_store.get(scenario_id)
+
+def _resolve_scenario(request: ObjectionRequest) -> Optional[dict]:
+    """Scenario for scenario_id if provided, else the closest curated one (if close enough)"""
+    if request.scenario_id:
+        return _find_scenario(request.scenario_id)
+    with metrics.timer("stage_duration_seconds", endpoint="objection", stage="scenario_match"):
+        matches = scenario_matcher.match(request.objection_text, 1)
+    if matches and matches[0][1] >= SCENARIO_MATCH_MIN_SCORE:
+        return matches[0][0]
+    return None
+
+def _objection_prompt(template: PromptTemplate, objection_text: str, scenario_used: Optional[dict]) -> str:
+    """Render the coaching prompt, trimmed to the template's token budgets"""
+    return template.render(
+        objection=objection_text,
+        context=scenario_used["context"] if scenario_used else "General sales objection",
+    )
+
+def _objection_prompt_hash(scenario: dict, language: str) -> str:
+    """Version key of the full prompt used to coach a curated scenario"""
+    template = prompt_catalog.objection(language)
+    return prompt_hash(model_router.route("objection").signature(), template.version, _objection_prompt(template, scenario["objection"], scenario))
+
+async def _send_prompt(
+    session_prefix: str, template: PromptTemplate, request_class: str, prompt: str, accept=None, on_chunk=None
+) -> str:
+    """One routed model call with the template's system message and output limit
+
+    With ``on_chunk`` the reply is streamed and each chunk handed to it as it
+    arrives (no hedging, and ``accept`` is not consulted); the whole reply is
+    returned either way.
+    """
+    metrics.inc(
+        "llm_prompt_tokens_estimated_total", template.system_tokens + estimate_tokens(prompt), template=template.name
+    )
+    if on_chunk is None:
+        return await model_router.send(
+            request_class, session_prefix, template.system, prompt,
+            max_output_tokens=template.max_output_tokens, accept=accept,
+        )
+    chunks = []
+    async for chunk in model_router.stream(
+        request_class, session_prefix, template.system, prompt, max_output_tokens=template.max_output_tokens
+    ):
+        chunks.append(chunk)
+        on_chunk(chunk)
+    return "".join(chunks)
+
+async def _generate_scenario_response(scenario: dict, language: str) -> str:
+    """Coach a curated scenario's own objection (used for pre-generation)"""
+    template = prompt_catalog.objection(language)
+    return await _send_prompt("objection", template, "objection", _objection_prompt(template, scenario["objection"], scenario))
+
+def _as_scenario(request: ObjectionRequest, scenario_used: Optional[dict]) -> bool:
+    """Whether the request is answered as its curated scenario: matched free text, or the objection verbatim
+
+    A scenario_id with different text of its own keeps that text in the prompt.
+    """
+    if scenario_used is None:
+        return False
+    return not request.scenario_id or normalize_text(request.objection_text) == normalize_text(scenario_used["objection"])
+
+async def _generate_objection_response(request: ObjectionRequest, on_chunk=None) -> AIResponse:
+    """Generate (or fetch from cache or precomputed store) the coaching response for an objection
+
+    ``on_chunk`` receives the text as it streams from the model; cached,
+    precomputed and coalesced replies don't go through it.
+    """
+    scenario_used = _resolve_scenario(request)
+    as_scenario = _as_scenario(request, scenario_used)
+    
+    # Serve repeat objections from the cache; every phrasing of a curated scenario shares its entry
+    with metrics.timer("stage_duration_seconds", endpoint="objection", stage="cache_lookup"):
+        version = prompt_catalog.objection(request.language).version
+        if as_scenario:
+            cache_key = make_scenario_key(scenario_used["id"], request.language, version)
+        else:
+            cache_key = make_objection_key(
+                request.objection_text, request.language, scenario_used["id"] if scenario_used else None, version
+            )
+        cached = await objection_cache.get(cache_key)
+    if cached is not None:
+        return AIResponse(**cached)
+    
+    # Identical requests already in flight share one upstream call
+    result = await objection_flights.do(
+        cache_key, lambda: _produce_objection_response(request, scenario_used, as_scenario, cache_key, on_chunk)
+    )
+    return AIResponse(**result)
+
+async def _produce_objection_response(
+    request: ObjectionRequest, scenario_used: Optional[dict], as_scenario: bool, cache_key: str, on_chunk=None
+) -> dict:
+    """Precomputed or freshly generated response for a cache miss, stored in the cache"""
+    ai_response = None
+    # Curated scenarios may have been pre-generated offline
+    if as_scenario:
+        with metrics.timer("stage_duration_seconds", endpoint="objection", stage="precomputed_lookup"):
+            ai_response = await precomputed_store.get(scenario_used, request.language or "English")
+    
+    if ai_response is None:
+        with metrics.timer("stage_duration_seconds", endpoint="objection", stage="prompt_build"):
+            template = prompt_catalog.objection(request.language)
+            objection_text = scenario_used["objection"] if as_scenario else request.objection_text
+            prompt = _objection_prompt(template, objection_text, scenario_used)
+        with metrics.timer("stage_duration_seconds", endpoint="objection", stage="llm_call"):
+            ai_response = await _send_prompt("objection", template, "objection", prompt, on_chunk=on_chunk)
+    
+    result = AIResponse(
+        response=ai_response,
+        scenario_used=Scenario(**scenario_used) if scenario_used else None
+    ).model_dump()
+    await objection_cache.set(cache_key, result)
+    return result
+
+def _feedback_prompt(scenario: dict, response: PracticeResponse) -> str:
+    return prompt_catalog.feedback.render(
+        objection=scenario["objection"],
+        context=scenario["context"],
+        suggested_response=scenario["suggested_response"],
+        user_response=response.user_response,
+    )
+
+def _is_valid_feedback(reply: str) -> bool:
+    """Whether a routed feedback reply is usable (a hedge keeps waiting for one that is)"""
+    try:
+        parse_feedback_reply(reply)
+    except FeedbackParseError:
+        return False
+    return True
+
+async def _generate_feedback(scenario: dict, response: PracticeResponse, on_chunk=None) -> PracticeFeedback:
+    """Feedback validated against the JSON contract, re-prompting only when a reply doesn't validate
+
+    ``on_chunk`` receives the first reply as it streams; repairs are not streamed.
+    """
+    with metrics.timer("stage_duration_seconds", endpoint="feedback", stage="prompt_build"):
+        prompt = _feedback_prompt(scenario, response)
+    with metrics.timer("stage_duration_seconds", endpoint="feedback", stage="llm_call"):
+        reply = await _send_prompt(
+            "practice", prompt_catalog.feedback, "feedback", prompt, _is_valid_feedback, on_chunk=on_chunk
+        )
+    
+    error = None
+    for attempt in range(FEEDBACK_REPAIR_ATTEMPTS + 1):
+        if attempt:
+            metrics.inc("feedback_repairs_total")
+            with metrics.timer("stage_duration_seconds", endpoint="feedback", stage="repair"):
+                reply = await _send_prompt(
+                    "practice", prompt_catalog.feedback, "feedback", repair_prompt(prompt, reply, error), _is_valid_feedback
+                )
+        try:
+            with metrics.timer("stage_duration_seconds", endpoint="feedback", stage="parse"):
+                parsed = parse_feedback_reply(reply)
+        except FeedbackParseError as e:
+            error = e
+            continue
+        return PracticeFeedback(feedback=render_feedback(parsed), score=parsed.score, suggestions=parsed.suggestions)
+    
+    # Keep the model's text, but never make up a score it didn't give
+    metrics.inc("feedback_parse_failures_total")
+    logger.warning(f"Feedback reply failed validation after {FEEDBACK_REPAIR_ATTEMPTS} repair(s): {error}")
+    score, suggestions = parse_markdown_feedback(reply)
+    return PracticeFeedback(feedback=reply, score=score, suggestions=suggestions)
+
+def _record_attempt(scenario: dict, response: PracticeResponse, feedback: PracticeFeedback):
+    practice_history.record({
+        "agent_id": response.agent_id or "anonymous",
+        "scenario_id": scenario["id"],
+        "category": scenario["category"],
+        "response_type": response.response_type,
+        "user_response": response.user_response,
+        "score": feedback.score,
+        "suggestions": feedback.suggestions,
+        "created_at": datetime.utcnow(),
+    })
+    if response.agent_id:
+        practice_selector.observe(response.agent_id, scenario["id"], feedback.score)
+
+def _record_error(handler: str, error: Exception):
+    metrics.inc("handler_errors_total", handler=handler, error=type(error).__name__)
+
+def _unavailable(error: LlmUnavailableError) -> HTTPException:
+    """503 telling the client when the AI service is worth retrying"""
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(max(1, round(error.retry_after)))},
+    )
+
+def _sse_event(event: str, data) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _stream_reply(pending: asyncio.Future, events: asyncio.Queue):
+    """Yield the events ``pending`` puts on ``events`` as it works, until it finishes
+
+    Events are ``(name, data)`` pairs; a keep-alive, sent whenever nothing
+    arrived for SSE_KEEPALIVE_SECONDS, is ``(None, None)``.
+    """
+    while not (pending.done() and events.empty()):
+        getter = asyncio.ensure_future(events.get())
+        done, _ = await asyncio.wait({getter, pending}, timeout=SSE_KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+        if getter in done:
+            yield getter.result()
+            continue
+        getter.cancel()
+        if not done:
+            yield None, None
+
+def _replay(text: str, shown: str = ""):
+    """``delta`` events for the part of ``text`` not streamed yet, per line"""
+    if not text.startswith(shown):
+        return
+    for chunk in text[len(shown):].splitlines(keepends=True):
+        yield "delta", {"text": chunk}
+
+async def _sse_stream(events):
+    try:
+        async for event, data in events:
+            yield ": keep-alive\n\n" if event is None else _sse_event(event, data)
+    finally:
+        # Close the producer now (not at garbage collection) so its cleanup runs
+        # as soon as the client goes away
+        await events.aclose()
+
+def _sse_response(events) -> StreamingResponse:
+    """Server-sent events response for an async iterable of ``(name, data)`` pairs"""
+    return StreamingResponse(
+        _sse_stream(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @api_router.post("/objection/handle", response_model=AIResponse)
 async def handle_objection(request: ObjectionRequest):
     """Handle merchant objection and provide AI-generated response"""
     try:
-        # Find matching scenario if scenario_id provided
-        scenario_used = None
-        if request.scenario_id:
-            scenario_used = next((s for s in DEMO_SCENARIOS if s["id"] == request.scenario_id), None)
-        
-        # Create language-specific system message
-        language_instruction = ""
-        if request.language in ["Hindi", "Hinglish"]:
-            language_instruction = "Respond in Hindi/Hinglish mixing as appropriate for the input language."
-        elif request.language in ["Marathi", "Kannada", "Tamil", "Telugu", "Bangla"]:
-            language_instruction = f"Respond in {request.language} language to match the input."
-        else:
-            language_instruction = "Respond in English."
-        
-        # Initialize Gemini chat with concise system message
-        chat = LlmChat(
-            api_key=os.environ.get('GEMINI_API_KEY'),
-            session_id=f"objection_{uuid.uuid4()}",
-            system_message=f"""You are a sales coach providing quick, actionable responses to sales objections.
-
-            RESPONSE FORMAT REQUIREMENTS:
-            1. Keep responses under 200 words
-            2. Be direct and practical
-            3. Provide 2-3 specific phrases the agent can use
-            4. {language_instruction}
-            5. Use simple, clear language
-            
-            Structure your response as:
-            **Quick Strategy:** [1-2 sentences]
-            **What to Say:** [2-3 specific phrases]
-            **Why This Works:** [1 sentence explanation]"""
-        ).with_model("gemini", "gemini-2.5-pro")
-        
-        # Create concise prompt for AI
-        prompt = f"""Handle this objection: "{request.objection_text}"
-        
-        Context: {scenario_used["context"] if scenario_used else "General sales objection"}
-        
-        Give a brief, practical response strategy."""
+        return await _generate_objection_response(request)
+    except LlmUnavailableError as e:
+        _record_error("objection", e)
+        raise _unavailable(e)
+    except Exception as e:
+        _record_error("objection", e)
+        raise HTTPException(status_code=500, detail=f"Error generating AI response: {str(e)}")
+
+@api_router.post("/objection/handle/stream")
+async def handle_objection_stream(request: ObjectionRequest):
+    """Stream the objection response as server-sent events (start, delta..., done)
+
+    Deltas are forwarded as the model produces them when its provider can
+    stream (LLM_PROVIDER=stub can). The Gemini integration only returns whole
+    replies, so there the text arrives in one go once generated, with
+    keep-alives until then. Cached and precomputed replies are sent right away.
+    """
+    scenario_used = _resolve_scenario(request)
+    
+    async def events():
+        yield "start", {"scenario_used": scenario_used}
+        queue: asyncio.Queue = asyncio.Queue()
+        shown = []
         
-        user_message = UserMessage(text=prompt)
-        ai_response = await chat.send_message(user_message)
+        def on_chunk(chunk: str):
+            shown.append(chunk)
+            queue.put_nowait(("delta", {"text": chunk}))
         
-        return AIResponse(
-            response=ai_response,
-            scenario_used=Scenario(**scenario_used) if scenario_used else None
+        # Keep generating (and caching) even if the client goes away mid-stream
+        pending = asyncio.ensure_future(_generate_objection_response(request, on_chunk))
+        try:
+            async for event in _stream_reply(pending, queue):
+                yield event
+            result = pending.result()
+            for event in _replay(result.response, "".join(shown)):
+                yield event
+            yield "done", result.model_dump()
+        except Exception as e:
+            _record_error("objection_stream", e)
+            yield "error", {"detail": f"Error generating AI response: {str(e)}"}
+    
+    return _sse_response(events())
+
+@api_router.post("/objection/handle/batch", response_model=BatchObjectionResponse)
+async def handle_objection_batch(batch: BatchObjectionRequest):
+    """Handle a deck of objections concurrently, with per-item timeouts and errors
+
+    Results come back in request order, or as server-sent ``result`` events in
+    completion order when ``stream`` is set.
+    """
+    semaphore = asyncio.Semaphore(min(batch.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    
+    async def run(index: int, item: ObjectionRequest) -> BatchItemResult:
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(_generate_objection_response(item), BATCH_ITEM_TIMEOUT)
+                return BatchItemResult(index=index, result=result)
+            except asyncio.TimeoutError as e:
+                _record_error("objection_batch", e)
+                return BatchItemResult(index=index, error=f"Timed out after {BATCH_ITEM_TIMEOUT:g}s")
+            except Exception as e:
+                _record_error("objection_batch", e)
+                return BatchItemResult(index=index, error=f"Error generating AI response: {str(e)}")
+    
+    if not batch.stream:
+        return BatchObjectionResponse(
+            results=await asyncio.gather(*(run(index, item) for index, item in enumerate(batch.items)))
         )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating AI response: {str(e)}")
+    
+    async def events():
+        # Start the calls only once the response body runs, so nothing is left
+        # running if the client disconnects before the stream starts
+        tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(batch.items)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item_result = await finished
+                yield "result", item_result.model_dump()
+            yield "done", {"count": len(tasks)}
+        finally:
+            # Stop the remaining upstream calls if the client goes away
+            for task in tasks:
+                task.cancel()
+    
+    return _sse_response(events())
+
+@api_router.get("/metrics")
+async def get_metrics(format: str = "prometheus"):
+    """Expose request, stage, LLM and cache metrics (Prometheus text, or format=json)"""
+    if format == "json":
+        return {
+            "latency": metrics.summary(),
+            "cache": objection_cache.stats(),
+            "precomputed": precomputed_store.stats(),
+            "llm": llm_client.stats(),
+            "routing": model_router.stats(),
+            "history": practice_history.stats(),
+            "practice_selector": practice_selector.stats(),
+            "jobs": job_queue.stats(),
+        }
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@api_router.get("/llm/stats")
+async def get_llm_stats():
+    """Get concurrency, retry and circuit-breaker state of the LLM client, and model routing latencies"""
+    return {**llm_client.stats(), "routing": model_router.stats()}
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Get hit/miss counters for the objection response cache"""
+    return {
+        **objection_cache.stats(),
+        "precomputed": precomputed_store.stats(),
+        "single_flight": objection_flights.stats(),
+    }
 
 @api_router.post("/practice/feedback", response_model=PracticeFeedback)
 async def get_practice_feedback(response: PracticeResponse):
     """Provide AI feedback on practice response"""
+    # Find the scenario
+    scenario = _find_scenario(response.scenario_id)
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    
     try:
-        # Find the scenario
-        scenario = next((s for s in DEMO_SCENARIOS if s["id"] == response.scenario_id), None)
-        if not scenario:
-            raise HTTPException(status_code=404, detail="Scenario not found")
-        
-        # Initialize Gemini chat with concise feedback system
-        chat = LlmChat(
-            api_key=os.environ.get('GEMINI_API_KEY'),
-            session_id=f"practice_{uuid.uuid4()}",
-            system_message="""You are a sales trainer providing concise feedback on practice responses.
-
-            FEEDBACK FORMAT:
-            1. Keep feedback under 150 words
-            2. Be encouraging but honest
-            3. Provide specific, actionable suggestions
-            4. Rate responses 1-10 based on effectiveness
-            
-            Structure:
-            **Score:** [X/10]
-            **What worked:** [1-2 strengths]
-            **Improve:** [2-3 specific suggestions]"""
-        ).with_model("gemini", "gemini-2.5-pro")
-        
-        prompt = f"""Objection: "{scenario["objection"]}"
-        Context: {scenario["context"]}
-        Expected approach: {scenario["suggested_response"]}
-        
-        Agent's response: "{response.user_response}"
-        
-        Provide brief, actionable feedback with a score 1-10."""
-        
-        user_message = UserMessage(text=prompt)
-        ai_response = await chat.send_message(user_message)
-        
-        # Parse the AI response more reliably
-        lines = ai_response.strip().split('\n')
-        feedback_text = ""
-        score = 7  # default score
-        suggestions = []
-        
-        # Extract score if present
-        for line in lines:
-            if "score:" in line.lower() or "/10" in line:
-                try:
-                    import re
-                    score_match = re.search(r'(\d+)(?:/10)?', line)
-                    if score_match:
-                        score = int(score_match.group(1))
-                        score = min(10, max(1, score))  # Ensure score is 1-10
-                except:
-                    score = 7
-                break
-        
-        # Use full response as feedback if parsing fails
-        feedback_text = ai_response
-        
-        # Extract suggestions if present
-        in_suggestions = False
-        for line in lines:
-            line = line.strip()
-            if "improve:" in line.lower() or "suggestions:" in line.lower():
-                in_suggestions = True
-                continue
-            if in_suggestions and line.startswith(("-", "•", "1.", "2.", "3.")):
-                suggestions.append(line.lstrip("-•123456789. "))
-        
-        return PracticeFeedback(
-            feedback=feedback_text,
-            score=score,
-            suggestions=suggestions[:3]  # Limit to 3 suggestions
-        )
+        feedback = await _generate_feedback(scenario, response)
+        _record_attempt(scenario, response, feedback)
+        return feedback
         
+    except LlmUnavailableError as e:
+        _record_error("feedback", e)
+        raise _unavailable(e)
     except Exception as e:
+        _record_error("feedback", e)
         raise HTTPException(status_code=500, detail=f"Error generating feedback: {str(e)}")
 
+@api_router.post("/practice/feedback/stream")
+async def get_practice_feedback_stream(response: PracticeResponse):
+    """Stream practice feedback as server-sent events (start, delta..., score, suggestions, done)
+
+    The model's JSON reply is parsed as it streams: ``score`` and
+    ``suggestions`` are sent as soon as each field is complete, and ``delta``
+    carries the rendered markdown as it grows. With a provider that can't
+    stream (the Gemini integration) they all arrive once the reply is complete.
+    ``done`` holds the validated feedback, which replaces the streamed one if a
+    repair was needed.
+    """
+    scenario = _find_scenario(response.scenario_id)
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    
+    return _sse_response(_feedback_events(scenario, response))
+
+async def _feedback_events(scenario: dict, response: PracticeResponse):
+    """Feedback events as ``(name, data)`` pairs, shared by the SSE and WebSocket endpoints"""
+    yield "start", {"scenario_id": scenario["id"]}
+    queue: asyncio.Queue = asyncio.Queue()
+    parser = FeedbackStreamParser()
+    shown = ""
+    
+    def on_chunk(chunk: str):
+        nonlocal shown
+        for name, value in parser.feed(chunk).items():
+            if name != "strengths":
+                queue.put_nowait((name, {name: value}))
+        rendered = parser.rendered()
+        if len(rendered) > len(shown) and rendered.startswith(shown):
+            queue.put_nowait(("delta", {"text": rendered[len(shown):]}))
+            shown = rendered
+    
+    pending = asyncio.ensure_future(_generate_feedback(scenario, response, on_chunk))
+    try:
+        async for event in _stream_reply(pending, queue):
+            yield event
+        feedback = pending.result()
+        _record_attempt(scenario, response, feedback)
+        for event in _replay(feedback.feedback, shown):
+            yield event
+        # Fields the stream didn't settle (repaired or markdown replies)
+        if feedback.score != parser.score:
+            yield "score", {"score": feedback.score}
+        if feedback.suggestions != parser.suggestions:
+            yield "suggestions", {"suggestions": feedback.suggestions}
+        yield "done", feedback.model_dump()
+    except Exception as e:
+        _record_error("feedback_stream", e)
+        yield "error", {"detail": f"Error generating feedback: {str(e)}"}
+    finally:
+        pending.cancel()
+
+async def _transcribe_voice(session, chunks) -> str:
+    """Feed an async iterable of audio chunks to a transcription session; errors become HTTPExceptions"""
+    try:
+        with metrics.timer("stage_duration_seconds", endpoint="voice_feedback", stage="transcribe"):
+            async for chunk in chunks:
+                session.feed(chunk)
+            transcript = await session.finish()
+    except WebSocketDisconnect:
+        session.cancel()
+        raise
+    except AudioTooLongError as e:
+        session.cancel()
+        raise HTTPException(status_code=413, detail=str(e))
+    except AudioFormatError as e:
+        session.cancel()
+        raise HTTPException(status_code=400, detail=str(e))
+    except SttUnavailableError as e:
+        session.cancel()
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        session.cancel()
+        _record_error("voice_feedback", e)
+        raise HTTPException(status_code=500, detail=f"Could not transcribe audio: {str(e)}")
+    if not transcript:
+        raise HTTPException(status_code=422, detail="No speech detected in the recording")
+    return transcript
+
+@api_router.post("/practice/feedback/voice")
+async def get_voice_practice_feedback(
+    request: Request,
+    scenario_id: int,
+    language: str = "English",
+    agent_id: Optional[str] = None,
+    sample_rate: Optional[int] = Query(None, ge=8000, le=96000),
+):
+    """Transcribe a voice answer on the server and stream feedback on it as server-sent events
+
+    The body is a 16-bit PCM WAV file (``audio/wav``), or raw 16-bit mono PCM
+    (``audio/l16``, ``sample_rate`` default 16000), and is transcribed as it
+    uploads. Events: transcript, then the same events as /practice/feedback/stream.
+    Browsers only send a body once it is complete, so the frontend records over
+    /practice/feedback/voice/ws instead.
+    """
+    scenario = _find_scenario(scenario_id)
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    if speech_transcriber.error is not None:
+        raise HTTPException(status_code=503, detail=speech_transcriber.error)
+    is_wav = request.headers.get("content-type", "").split(";")[0].strip() in ("audio/wav", "audio/x-wav", "audio/wave")
+    
+    # Utterances are transcribed in the pool while the rest is still uploading
+    session = speech_transcriber.session(language, None if is_wav else sample_rate or 16000)
+    transcript = await _transcribe_voice(session, request.stream())
+    response = PracticeResponse(scenario_id=scenario_id, user_response=transcript, response_type="voice", agent_id=agent_id)
+    
+    async def events():
+        yield "transcript", {"text": transcript}
+        async for event in _feedback_events(scenario, response):
+            yield event
+    
+    return _sse_response(events())
+
+@api_router.websocket("/practice/feedback/voice/ws")
+async def voice_practice_feedback_socket(
+    websocket: WebSocket,
+    scenario_id: int,
+    language: str = "English",
+    agent_id: Optional[str] = None,
+    sample_rate: int = Query(16000, ge=8000, le=96000),
+):
+    """Voice practice while recording: utterances are transcribed as the agent speaks
+
+    The client sends raw 16-bit mono PCM as binary messages while it records,
+    then the text message ``end``. Replies are JSON ``{"event", "data"}``
+    messages with the same events as /practice/feedback/voice; an ``error``
+    event carries ``detail`` and ``status``. The socket closes after ``done``
+    or ``error``.
+    """
+    await websocket.accept()
+    
+    async def send(event: str, data):
+        await websocket.send_json({"event": event, "data": data})
+    
+    async def chunks():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                yield message["bytes"]
+            elif message.get("text") == "end":
+                return
+    
+    try:
+        scenario = _find_scenario(scenario_id)
+        if not scenario:
+            raise HTTPException(status_code=404, detail="Scenario not found")
+        if speech_transcriber.error is not None:
+            raise HTTPException(status_code=503, detail=speech_transcriber.error)
+        transcript = await _transcribe_voice(speech_transcriber.session(language, sample_rate), chunks())
+    except HTTPException as e:
+        await send("error", {"detail": e.detail, "status": e.status_code})
+        await websocket.close()
+        return
+    except WebSocketDisconnect:
+        return
+    
+    response = PracticeResponse(scenario_id=scenario_id, user_response=transcript, response_type="voice", agent_id=agent_id)
+    events = _feedback_events(scenario, response)
+    try:
+        await send("transcript", {"text": transcript})
+        async for event, data in events:
+            if event is not None:
+                await send(event, data)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await events.aclose()
+
+async def _objection_job(payload: dict) -> dict:
+    return (await _generate_objection_response(ObjectionRequest(**payload))).model_dump()
+
+async def _feedback_job(payload: dict) -> dict:
+    response = PracticeResponse(**payload)
+    scenario = _find_scenario(response.scenario_id)
+    if not scenario:
+        raise JobFailed("Scenario not found")
+    feedback = await _generate_feedback(scenario, response)
+    _record_attempt(scenario, response, feedback)
+    return feedback.model_dump()
+
+# Background generations for clients that can't hold a connection open
+job_queue = JobQueue(
+    db.jobs,
+    {"objection": _objection_job, "feedback": _feedback_job},
+    workers=int(os.environ.get('JOB_WORKERS', '4')),
+    lease_seconds=float(os.environ.get('JOB_LEASE_SECONDS', '60')),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', '3')),
+    retention=timedelta(hours=float(os.environ.get('JOB_RETENTION_HOURS', '24'))),
+)
+
+def _job_status(job: dict) -> JobStatus:
+    return JobStatus(id=job["_id"], **{field: job[field] for field in JobStatus.model_fields if field != "id"})
+
+@api_router.post("/jobs/objection", response_model=JobStatus, status_code=202)
+async def create_objection_job(request: ObjectionRequest):
+    """Queue an objection response; poll GET /api/jobs/{id} for the result"""
+    return _job_status(await job_queue.enqueue("objection", request.model_dump()))
+
+@api_router.post("/jobs/feedback", response_model=JobStatus, status_code=202)
+async def create_feedback_job(response: PracticeResponse):
+    """Queue practice feedback; poll GET /api/jobs/{id} for the result"""
+    if not _find_scenario(response.scenario_id):
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    return _job_status(await job_queue.enqueue("feedback", response.model_dump()))
+
+@api_router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, wait: float = Query(0, ge=0)):
+    """Job status and result; with ``wait`` it holds the request until the job finishes (long-polling)"""
+    job = await job_queue.wait(job_id, min(wait, JOB_WAIT_MAX_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_status(job)
+
+PERIOD_PATTERN = f"^({'|'.join(PERIOD_FORMATS)})$"
+
+@api_router.get("/agents/{agent_id}/attempts")
+async def get_agent_attempts(
+    agent_id: str,
+    scenario_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Most recent practice attempts of an agent"""
+    return await practice_history.attempts(agent_id, scenario_id, skip, limit)
+
+@api_router.get("/agents/{agent_id}/trends")
+async def get_agent_trends(
+    agent_id: str,
+    scenario_id: Optional[int] = None,
+    period: str = Query("day", pattern=PERIOD_PATTERN),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(30, ge=1, le=365),
+):
+    """Average practice score per day/week/month for an agent"""
+    return await practice_history.agent_trend(agent_id, scenario_id, period, skip, limit)
+
+@api_router.get("/analytics/categories")
+async def get_category_trends(
+    agent_id: Optional[str] = None,
+    category: Optional[str] = None,
+    period: str = Query("day", pattern=PERIOD_PATTERN),
+    days: Optional[int] = Query(None, ge=1, le=3650),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Average practice score per category and period, for one agent or the whole team"""
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    return await practice_history.category_trend(agent_id, category, period, since, skip, limit)
+
+# Seconds per startup phase of this worker ("import" is server.py's own import)
+startup_phases: Dict[str, float] = {}
+
+# Longest wait for MongoDB during startup and in each readiness probe
+MONGO_STARTUP_TIMEOUT = float(os.environ.get('MONGO_STARTUP_TIMEOUT', '5'))
+READY_MONGO_TIMEOUT = float(os.environ.get('READY_MONGO_TIMEOUT', '2'))
+
+async def _timed(phase: str, awaitable):
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        startup_phases[phase] = round(time.perf_counter() - started, 4)
+
+async def _ping_mongo(timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout)
+        return True
+    except Exception as e:
+        logger.warning(f"MongoDB is not reachable: {e!r}")
+        return False
+
+async def _prepare_mongo():
+    """Create every collection's indexes, then load the catalog from MongoDB"""
+    await _timed("mongo_indexes", asyncio.gather(
+        objection_cache.ensure_indexes(),
+        scenario_store.ensure_indexes(),
+        precomputed_store.ensure_indexes(),
+        practice_history.ensure_indexes(),
+        job_queue.ensure_indexes(),
+    ))
+    await _timed("catalog", _load_catalog())
+
+async def _prepare_deferred_mongo(state):
+    """MongoDB work skipped at startup; a failed attempt is retried by the next readiness probe"""
+    try:
+        await _prepare_mongo()
+        state.mongo_deferred = False
+        logger.info("MongoDB reachable again; indexes and catalog are ready")
+    except Exception as e:
+        logger.warning(f"Deferred MongoDB startup failed: {e}")
+
+async def _warm_llm(app: FastAPI):
+    """Import the LLM integration off the event loop, before the first request needs it"""
+    try:
+        await asyncio.to_thread(llm_client.warm, model_router.route("objection").primary)
+        app.state.llm_error = None
+    except Exception as e:
+        app.state.llm_error = f"{type(e).__name__}: {e}"
+        logger.error(f"Could not load the LLM provider {llm_client.provider!r}: {e}")
+
+@api_router.get("/health/live")
+async def liveness():
+    """The process is up (no dependency checks)"""
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def readiness(request: Request):
+    """Whether this worker should get traffic: startup finished, MongoDB reachable, LLM provider loadable
+
+    Voice transcription is optional, so an STT engine that can't load is reported
+    in ``stt_error`` (and the voice endpoint answers 503) without making the
+    worker unready for everything else. If MongoDB was down at startup, the first probe that reaches it starts the
+    deferred index creation and catalog load; the worker turns ready when that finishes.
+    """
+    state = request.app.state
+    mongo = await _ping_mongo(READY_MONGO_TIMEOUT)
+    if mongo and state.mongo_deferred and (state.mongo_prepare is None or state.mongo_prepare.done()):
+        state.mongo_prepare = asyncio.create_task(_prepare_deferred_mongo(state))
+    checks = {
+        "startup": state.started and not state.stopping,
+        "mongo": mongo and not state.mongo_deferred,
+        "llm": state.llm_error is None,
+    }
+    ready = all(checks.values())
+    return JSONResponse(
+        {
+            "ready": ready,
+            "checks": checks,
+            "llm_error": state.llm_error,
+            "stt_error": speech_transcriber.error,
+            "catalog": {"scenarios": len(scenario_store), "source": scenario_store.source},
+            "startup_seconds": startup_phases,
+        },
+        status_code=200 if ready else 503,
+    )
+
 # Include the router in the main app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown of one worker process (each worker runs its own)
+
+    MongoDB is pinged first with a short timeout. When it answers, all indexes
+    are created concurrently and the catalog (with its pre-serialized bodies
+    and match index) is loaded from it; when it doesn't, the worker starts on
+    the built-in catalog and /api/health/ready reports not-ready until the
+    deferred MongoDB work is done. The LLM integration is imported in a thread
+    meanwhile.
+    """
+    started = time.perf_counter()
+    app.state.started = False
+    app.state.stopping = False
+    app.state.llm_error = None
+    app.state.mongo_prepare = None
+    warming = asyncio.create_task(_timed("llm_warm", _warm_llm(app)))
+    if speech_transcriber.check():
+        logger.error(f"Voice practice is unavailable: {speech_transcriber.error}")
+    mongo = await _timed("mongo_ping", _ping_mongo(MONGO_STARTUP_TIMEOUT))
+    app.state.mongo_deferred = not mongo
+    if mongo:
+        await _prepare_mongo()
+    else:
+        scenario_matcher.build(scenario_store.all())
+    await warming
+    if PRECOMPUTE_REFRESH_SECONDS > 0:
+        app.state.precompute_refresher = asyncio.create_task(refresh_forever(
+            precomputed_store,
+            scenario_store.all,
+            SUPPORTED_LANGUAGES,
+            _generate_scenario_response,
+            interval=PRECOMPUTE_REFRESH_SECONDS,
+            max_age=timedelta(days=PRECOMPUTE_MAX_AGE_DAYS) if PRECOMPUTE_MAX_AGE_DAYS else None,
+        ))
+    if CATALOG_POLL_SECONDS > 0:
+        app.state.catalog_follower = asyncio.create_task(
+            follow_catalog(catalog_version, _load_catalog, CATALOG_POLL_SECONDS)
+        )
+    practice_history.start()
+    job_queue.start()
+    startup_phases["startup"] = round(time.perf_counter() - started, 4)
+    app.state.started = True
+    logger.info(f"Ready: import {startup_phases['import']:.2f}s, startup {startup_phases['startup']:.2f}s")
+    
+    yield
+    
+    app.state.stopping = True
+    refresher = getattr(app.state, "precompute_refresher", None)
+    if refresher is not None:
+        refresher.cancel()
+    follower = getattr(app.state, "catalog_follower", None)
+    if follower is not None:
+        follower.cancel()
+    await job_queue.stop()
+    await practice_history.stop()
+    speech_transcriber.shutdown()
+    client.close()
+
+# Create the main app without a prefix
+app = FastAPI(lifespan=lifespan)
+
 app.include_router(api_router)
 
 app.add_middleware(
@@ -285,6 +1248,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    MetricsMiddleware,
+    registry=metrics,
+    json_access_log=os.environ.get('ACCESS_LOG_JSON', 'false').lower() == 'true',
+)
+
+def _collect_component_metrics():
+    """Scrape-time samples owned by the cache and the LLM client"""
+    cache_stats = objection_cache.stats()
+    for key in ("hits", "misses", "shared_hits", "evictions", "expirations"):
+        yield f"objection_cache_{key}_total", "counter", {}, cache_stats[key]
+    yield "objection_cache_entries", "gauge", {}, cache_stats["entries"]
+    yield "objection_cache_hit_ratio", "gauge", {}, cache_stats["hit_rate"]
+    precomputed_stats = precomputed_store.stats()
+    yield "precomputed_hits_total", "counter", {}, precomputed_stats["hits"]
+    yield "precomputed_misses_total", "counter", {}, precomputed_stats["misses"]
+    llm_stats = llm_client.stats()
+    for key in ("in_flight", "queued"):
+        yield f"llm_{key}", "gauge", {}, llm_stats[key]
+    for key in ("calls", "retries", "failures", "rejections"):
+        yield f"llm_{key}_total", "counter", {}, llm_stats[key]
+    yield "llm_circuit_open", "gauge", {}, 0 if llm_stats["circuit"] == "closed" else 1
+    if llm_stats["rate_limit"] is not None:
+        for key in ("granted", "waited", "rejected"):
+            yield f"llm_rate_limit_{key}_total", "counter", {}, llm_stats["rate_limit"][key]
+    for model, latency in model_router.stats()["models"].items():
+        for key in ("ewma", "p95"):
+            if latency[f"{key}_seconds"] is not None:
+                yield f"llm_model_latency_{key}_seconds", "gauge", {"model": model}, latency[f"{key}_seconds"]
+    flight_stats = objection_flights.stats()
+    yield "objection_inflight_keys", "gauge", {}, flight_stats["in_flight"]
+    yield "objection_upstream_executions_total", "counter", {}, flight_stats["executions"]
+    yield "objection_coalesced_total", "counter", {}, flight_stats["coalesced"]
+    history_stats = practice_history.stats()
+    yield "practice_history_buffered", "gauge", {}, history_stats["buffered"]
+    for key in ("recorded", "written", "dropped", "write_errors", "rejected"):
+        yield f"practice_history_{key}_total", "counter", {}, history_stats[key]
+    job_stats = job_queue.stats()
+    yield "jobs_running", "gauge", {}, job_stats["running"]
+    for key in ("enqueued", "succeeded", "failed", "retried"):
+        yield f"jobs_{key}_total", "counter", {}, job_stats[key]
+    selector_stats = practice_selector.stats()
+    yield "practice_selector_agents", "gauge", {}, selector_stats["agents"]
+    for key in ("hits", "loads", "evictions"):
+        yield f"practice_selector_{key}_total", "counter", {}, selector_stats[key]
+    for phase, seconds in startup_phases.items():
+        yield "startup_phase_seconds", "gauge", {"phase": phase}, seconds
+
+
+metrics.register_collector(_collect_component_metrics)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -292,6 +1306,4 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+startup_phases["import"] = round(time.perf_counter() - _IMPORT_STARTED, 4)
@@ -0,0 +1,198 @@
+"""State shared by every worker process: response cache entries and rate limits.
+
+``MongoStateBackend`` keeps it in MongoDB so all gunicorn/uvicorn workers (and
+hosts) see one cache and one upstream quota. ``LocalStateBackend`` is an
+in-process stand-in with the same interface for tests and single-worker runs;
+with several workers each one gets its own copy.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Optimistic-concurrency attempts per token before backing off
+_BUCKET_CAS_ATTEMPTS = 5
+
+
+def _refill(tokens: float, updated_at: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+
+class LocalKeyValue:
+    def __init__(self):
+        self._entries: Dict[str, Any] = {}
+
+    async def ensure_indexes(self):
+        pass
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: float):
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+
+
+class MongoKeyValue:
+    """Entries stored as ``{_id, value, expires_at}`` and expired by a TTL index"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def ensure_indexes(self):
+        try:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Could not create TTL index on {self.collection.name}: {e}")
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            doc = await self.collection.find_one({"_id": key})
+        except Exception as e:
+            logger.warning(f"Could not read shared entry: {e}")
+            return None
+        # The TTL monitor only runs once a minute, so check expiry ourselves too
+        if not doc or doc.get("expires_at", datetime.min) <= datetime.utcnow():
+            return None
+        return doc["value"]
+
+    async def set(self, key: str, value: Dict[str, Any], ttl_seconds: float):
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "value": value, "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Could not write shared entry: {e}")
+
+
+class LocalStateBackend:
+    kind = "local"
+
+    def __init__(self):
+        self._stores: Dict[str, LocalKeyValue] = {}
+        self._buckets: Dict[str, tuple] = {}
+
+    def key_value(self, namespace: str) -> LocalKeyValue:
+        return self._stores.setdefault(namespace, LocalKeyValue())
+
+    async def take_token(self, bucket: str, rate: float, capacity: float) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available"""
+        now = time.time()
+        tokens, updated_at = self._buckets.get(bucket, (capacity, now))
+        tokens = _refill(tokens, updated_at, now, rate, capacity)
+        if tokens < 1:
+            self._buckets[bucket] = (tokens, now)
+            return (1 - tokens) / rate
+        self._buckets[bucket] = (tokens - 1, now)
+        return 0.0
+
+
+class MongoStateBackend:
+    """Cache namespaces are collections of ``db``; buckets live in ``rate_limits``.
+
+    A bucket is one document ``{_id, tokens, updated_at}`` updated with a
+    compare-and-set on its previous values, so concurrent workers never hand out
+    the same token. If MongoDB is unreachable the limiter fails open (logged),
+    like every other Mongo-backed component here.
+    """
+
+    kind = "mongo"
+
+    def __init__(self, db):
+        self.db = db
+        self.buckets = db.rate_limits
+        self._stores: Dict[str, MongoKeyValue] = {}
+
+    def key_value(self, namespace: str) -> MongoKeyValue:
+        return self._stores.setdefault(namespace, MongoKeyValue(self.db[namespace]))
+
+    async def take_token(self, bucket: str, rate: float, capacity: float) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available"""
+        try:
+            for _ in range(_BUCKET_CAS_ATTEMPTS):
+                now = time.time()
+                doc = await self.buckets.find_one({"_id": bucket})
+                if doc is None:
+                    try:
+                        await self.buckets.insert_one({"_id": bucket, "tokens": capacity - 1, "updated_at": now})
+                        return 0.0
+                    except DuplicateKeyError:
+                        continue
+                tokens = _refill(doc["tokens"], doc["updated_at"], now, rate, capacity)
+                if tokens < 1:
+                    return (1 - tokens) / rate
+                result = await self.buckets.update_one(
+                    {"_id": bucket, "tokens": doc["tokens"], "updated_at": doc["updated_at"]},
+                    {"$set": {"tokens": tokens - 1, "updated_at": now}},
+                )
+                if result.modified_count:
+                    return 0.0
+        except Exception as e:
+            logger.warning(f"Rate limit state unavailable, allowing call: {e}")
+            return 0.0
+        # Heavy contention on the bucket document: back off for about one token
+        return 1 / rate
+
+
+def create_state_backend(kind: str, db):
+    if kind == "mongo":
+        return MongoStateBackend(db)
+    if kind == "local":
+        return LocalStateBackend()
+    raise ValueError(f"Unknown shared state backend: {kind!r} (expected 'mongo' or 'local')")
+
+
+class TokenBucketLimiter:
+    """Global rate limit of ``rate`` calls per second with bursts up to ``burst``"""
+
+    def __init__(self, backend, name: str, rate: float, burst: Optional[float] = None):
+        self.backend = backend
+        self.name = name
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.granted = 0
+        self.waits = 0
+        self.rejected = 0
+
+    async def acquire(self, timeout: float) -> float:
+        """Wait up to ``timeout`` seconds for a token.
+
+        Returns 0 once a token is taken, otherwise the number of seconds until
+        one is expected (the caller's Retry-After).
+        """
+        deadline = time.monotonic() + timeout
+        waited = False
+        while True:
+            wait = await self.backend.take_token(self.name, self.rate, self.burst)
+            if wait <= 0:
+                self.granted += 1
+                self.waits += waited
+                return 0.0
+            if wait > deadline - time.monotonic():
+                self.rejected += 1
+                return wait
+            waited = True
+            await asyncio.sleep(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend.kind,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "granted": self.granted,
+            "waited": self.waits,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "abandoned")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight execution.
+
+    The first caller for a key starts ``fn()`` as a task; callers arriving while
+    it runs await the same task and receive its result (or exception). Each
+    waiter is shielded, so one disconnecting client doesn't cancel the call for
+    the others; only when every waiter has gone is the task itself cancelled.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None or call.abandoned:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Everyone who wanted this result has gone away
+                call.abandoned = True
+                call.task.cancel()
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,342 @@
+"""Server-side speech-to-text for voice practice answers.
+
+Audio arrives as a stream of WAV or raw 16-bit PCM chunks; the frontend sends
+them over a WebSocket while the agent is still speaking. A lightweight
+energy-based voice activity detector cuts the stream into utterances, and each
+finished utterance is transcribed right away by a local STT engine in a process
+pool, so by the time the recording stops only the last utterance is left to
+transcribe.
+
+Engines are chosen with ``STT_ENGINE``:
+
+- ``whisper``: faster-whisper (``pip install -r requirements-stt.txt``), multilingual,
+  model from ``STT_MODEL`` (default ``small``).
+- ``stub``: returns ``STT_STUB_TEXT`` per utterance, for tests and benchmarks.
+"""
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper language codes for the languages offered by the frontend (None: auto-detect)
+LANGUAGE_CODES = {
+    "English": "en",
+    "Hindi": "hi",
+    "Hinglish": None,
+    "Marathi": "mr",
+    "Kannada": "kn",
+    "Tamil": "ta",
+    "Telugu": "te",
+    "Bangla": "bn",
+}
+
+
+class AudioFormatError(ValueError):
+    pass
+
+
+class AudioTooLongError(AudioFormatError):
+    pass
+
+
+class SttUnavailableError(RuntimeError):
+    """The STT engine can't run here (not installed, or its worker processes died)"""
+
+
+# Engine instance of the current worker process, created by _init_worker
+_engine = None
+
+
+class _WhisperEngine:
+    def __init__(self, model: str):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(model, device="cpu", compute_type="int8")
+
+    def transcribe(self, samples: np.ndarray, language: Optional[str]) -> str:
+        segments, _ = self.model.transcribe(samples, language=language, beam_size=1, vad_filter=False)
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+class _StubEngine:
+    def __init__(self, model: str):
+        self.text = os.environ.get("STT_STUB_TEXT", "I understand your concern, let me show you the value.")
+
+    def transcribe(self, samples: np.ndarray, language: Optional[str]) -> str:
+        return self.text
+
+
+_ENGINES = {"whisper": _WhisperEngine, "stub": _StubEngine}
+
+# Module each engine imports in the pool processes
+_ENGINE_MODULES = {"whisper": "faster_whisper"}
+
+
+def _init_worker(engine: str, model: str):
+    global _engine
+    _engine = _ENGINES[engine](model)
+
+
+def _transcribe(pcm: bytes, sample_rate: int, language: Optional[str]) -> str:
+    """Runs in a pool process: 16-bit mono PCM in, text out"""
+    samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_rate != 16000:
+        # Linear resampling is enough for speech recognition
+        target = int(len(samples) * 16000 / sample_rate)
+        samples = np.interp(np.linspace(0, len(samples), target, endpoint=False), np.arange(len(samples)), samples)
+        samples = samples.astype(np.float32)
+    return _engine.transcribe(samples, language).strip()
+
+
+class SpeechSegmenter:
+    """Cuts 16-bit mono PCM into utterances at pauses of ``silence_ms`` or longer.
+
+    Frames of ``frame_ms`` whose RMS exceeds ``threshold`` count as speech.
+    Segments with less than ``min_speech_ms`` of speech are dropped as noise, and
+    none grows past ``max_segment_seconds``.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        frame_ms: int = 30,
+        silence_ms: int = 600,
+        threshold: float = 500,
+        min_speech_ms: int = 200,
+        max_segment_seconds: float = 30,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.silence_frames = silence_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_segment_frames = int(max_segment_seconds * 1000 / frame_ms)
+        self.threshold = threshold
+        self._pending = b""
+        self._segment = bytearray()
+        self._segment_frames = 0
+        self._speech_frames = 0
+        self._silent_run = 0
+
+    def feed(self, pcm: bytes) -> List[bytes]:
+        """Add audio; returns the utterances completed by it"""
+        data = self._pending + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return []
+        frames = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, self.frame_bytes // 2).astype(np.float32)
+        voiced = np.sqrt(np.mean(frames * frames, axis=1)) > self.threshold
+
+        completed = []
+        for index, is_voiced in enumerate(voiced.tolist()):
+            if not is_voiced and self._speech_frames == 0:
+                continue  # silence before speech starts
+            start = index * self.frame_bytes
+            self._segment += data[start:start + self.frame_bytes]
+            self._segment_frames += 1
+            if is_voiced:
+                self._speech_frames += 1
+                self._silent_run = 0
+            else:
+                self._silent_run += 1
+            if self._silent_run >= self.silence_frames or self._segment_frames >= self.max_segment_frames:
+                segment = self._take()
+                if segment:
+                    completed.append(segment)
+        return completed
+
+    def flush(self) -> Optional[bytes]:
+        """The utterance still open when the audio ends, if any"""
+        self._segment += self._pending[: len(self._pending) - len(self._pending) % 2]
+        self._pending = b""
+        return self._take()
+
+    def _take(self) -> Optional[bytes]:
+        segment = bytes(self._segment) if self._speech_frames >= self.min_speech_frames else None
+        self._segment = bytearray()
+        self._segment_frames = self._speech_frames = self._silent_run = 0
+        return segment
+
+
+class _WavReader:
+    """Incremental RIFF/WAVE parser: yields PCM once the header has been read"""
+
+    def __init__(self):
+        self._buffer = b""
+        self.sample_rate: Optional[int] = None
+        self.channels = 1
+        self._in_data = False
+
+    def feed(self, data: bytes) -> bytes:
+        if self._in_data:
+            return data
+        self._buffer += data
+        if len(self._buffer) < 12:
+            return b""
+        if self._buffer[:4] != b"RIFF" or self._buffer[8:12] != b"WAVE":
+            raise AudioFormatError("Expected a WAV file")
+        offset = 12
+        while len(self._buffer) >= offset + 8:
+            chunk_id, size = self._buffer[offset:offset + 4], struct.unpack("<I", self._buffer[offset + 4:offset + 8])[0]
+            if chunk_id == b"data":
+                if self.sample_rate is None:
+                    raise AudioFormatError("WAV data before fmt chunk")
+                self._in_data = True
+                pcm, self._buffer = self._buffer[offset + 8:], b""
+                return pcm
+            if len(self._buffer) < offset + 8 + size:
+                return b""
+            if chunk_id == b"fmt ":
+                audio_format, channels, sample_rate = struct.unpack("<HHI", self._buffer[offset + 8:offset + 16])
+                bits = struct.unpack("<H", self._buffer[offset + 22:offset + 24])[0]
+                if audio_format != 1 or bits != 16:
+                    raise AudioFormatError("Only 16-bit PCM WAV is supported")
+                self.channels, self.sample_rate = channels, sample_rate
+            offset += 8 + size + size % 2
+        return b""
+
+
+class TranscriptionSession:
+    """One streamed recording: ``feed`` chunks as they arrive, then ``finish``"""
+
+    def __init__(self, transcriber: "SpeechTranscriber", language: Optional[str], sample_rate: Optional[int]):
+        self.transcriber = transcriber
+        self.language = LANGUAGE_CODES.get(language or "English", None)
+        self._wav = _WavReader() if sample_rate is None else None
+        self.sample_rate = sample_rate
+        self._segmenter = SpeechSegmenter(sample_rate, threshold=transcriber.threshold) if sample_rate else None
+        self._futures: List[asyncio.Future] = []
+        self._odd_byte = b""
+        self.audio_bytes = 0
+
+    def feed(self, data: bytes):
+        if self._wav is not None:
+            data = self._wav.feed(data)
+            if self._segmenter is None and self._wav.sample_rate:
+                self.sample_rate = self._wav.sample_rate
+                self._segmenter = SpeechSegmenter(self.sample_rate, threshold=self.transcriber.threshold)
+            if self._wav.channels == 2 and data:
+                data = self._downmix(data)
+        if not data:
+            return
+        self.audio_bytes += len(data)
+        if self.audio_bytes > self.transcriber.max_seconds * self.sample_rate * 2:
+            raise AudioTooLongError(f"Recording longer than {self.transcriber.max_seconds:g}s")
+        for segment in self._segmenter.feed(data):
+            self._submit(segment)
+
+    async def finish(self) -> str:
+        """Transcribe what is left and return the whole transcript"""
+        if self._segmenter is None:
+            raise AudioFormatError("No audio received")
+        segment = self._segmenter.flush()
+        if segment:
+            self._submit(segment)
+        texts = await asyncio.gather(*self._futures)
+        return " ".join(text for text in texts if text)
+
+    def cancel(self):
+        for future in self._futures:
+            future.cancel()
+
+    def _submit(self, segment: bytes):
+        self._futures.append(asyncio.ensure_future(
+            self.transcriber.transcribe(segment, self.sample_rate, self.language)
+        ))
+
+    def _downmix(self, data: bytes) -> bytes:
+        data = self._odd_byte + data
+        usable = len(data) - len(data) % 4
+        self._odd_byte = data[usable:]
+        stereo = np.frombuffer(data[:usable], dtype="<i2").reshape(-1, 2).astype(np.int32)
+        return stereo.mean(axis=1).astype("<i2").tobytes()
+
+
+class SpeechTranscriber:
+    """Process pool running the configured STT engine, started on first use.
+
+    ``check`` finds out up front whether the engine can load at all. A pool
+    whose processes die (e.g. killed for memory) is dropped and rebuilt on the
+    next call rather than failing every call after it.
+    """
+
+    def __init__(
+        self,
+        engine: str = "whisper",
+        model: str = "small",
+        workers: int = 2,
+        max_seconds: float = 120,
+        threshold: float = 500,
+    ):
+        if engine not in _ENGINES:
+            raise ValueError(f"Unknown STT engine: {engine!r} (expected one of {', '.join(_ENGINES)})")
+        self.engine = engine
+        self.model = model
+        self.workers = workers
+        self.max_seconds = max_seconds
+        self.threshold = threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.segments = 0
+        self.pool_restarts = 0
+        self.error: Optional[str] = None
+
+    def check(self) -> Optional[str]:
+        """Why the engine can't load in this environment (None if it can); also kept in ``error``"""
+        module = _ENGINE_MODULES.get(self.engine)
+        if module and importlib.util.find_spec(module) is None:
+            self.error = f"STT engine {self.engine!r} needs the {module} package, which is not installed (pip install -r requirements-stt.txt)"
+        else:
+            self.error = None
+        return self.error
+
+    def session(self, language: Optional[str], sample_rate: Optional[int] = None) -> TranscriptionSession:
+        """New streamed recording; ``sample_rate`` for raw PCM, None for WAV"""
+        return TranscriptionSession(self, language, sample_rate)
+
+    async def transcribe(self, pcm: bytes, sample_rate: int, language: Optional[str]) -> str:
+        if self.error is not None:
+            raise SttUnavailableError(self.error)
+        if self._pool is None:
+            # Spawn, not fork: the server process runs threads (motor, anyio) whose locks a fork would copy
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.engine, self.model),
+            )
+        self.segments += 1
+        pool = self._pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, _transcribe, pcm, sample_rate, language)
+        except BrokenProcessPool as e:
+            # Concurrent segments see the same broken pool; only the first replaces it
+            if self._pool is pool:
+                self._pool = None
+                self.pool_restarts += 1
+                pool.shutdown(wait=False, cancel_futures=True)
+                logger.error(f"STT worker pool broke, rebuilding it on the next recording: {e}")
+            raise SttUnavailableError("Speech-to-text workers failed, please retry") from e
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "engine": self.engine,
+            "workers": self.workers,
+            "started": self._pool is not None,
+            "segments": self.segments,
+            "pool_restarts": self.pool_restarts,
+            "error": self.error,
+        }
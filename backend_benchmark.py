@@ -0,0 +1,311 @@
+"""Load and latency benchmark for the Sales Training Assistant API.
+
+Starts ``backend/server.py`` under uvicorn with the stub LLM provider (and an
+in-memory MongoDB unless ``--mongo-url`` is given), then drives each endpoint
+with asyncio concurrency sweeps and reports throughput, tail latency and server
+memory. Baselines are saved as JSON so regressions can be caught before deploy:
+
+    python backend_benchmark.py --save bench_baseline.json
+    python backend_benchmark.py --compare bench_baseline.json --tolerance 0.2
+
+``--cold-start N`` also starts N fresh servers and times each from process
+spawn to its first 200 from /api/health/ready, with the server's own per-phase
+breakdown (import, MongoDB, catalog, LLM warm-up); ``--cold-start-only`` skips
+the load sweeps.
+
+Requires ``httpx`` and ``uvicorn``; the in-memory MongoDB needs ``mongomock-motor``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+
+
+def _practice_feedback(i, run):
+    return {
+        "scenario_id": i % 60 + 1,
+        "user_response": f"I hear you. Let me show you what you get for that price, attempt {run}-{i}.",
+        "response_type": "text",
+    }
+
+
+# name -> (method, path, body factory or None); factories get the request index and a tag unique to the
+# benchmark level, so "uncached" bodies never repeat across levels or runs against the same server
+ENDPOINTS = {
+    "root": ("GET", "/api/", None),
+    "scenarios": ("GET", "/api/scenarios", None),
+    "categories": ("GET", "/api/scenarios/categories", None),
+    "practice": ("GET", "/api/scenarios/practice", None),
+    "objection_cached": ("POST", "/api/objection/handle", lambda i, run: {
+        "objection_text": "Your commission is too high.", "language": "English", "scenario_id": 1,
+    }),
+    "objection_uncached": ("POST", "/api/objection/handle", lambda i, run: {
+        "objection_text": f"Your commission is too high, quote {run}-{i}.", "language": "English",
+    }),
+    "feedback": ("POST", "/api/practice/feedback", _practice_feedback),
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _ms(seconds):
+    """Seconds as milliseconds rounded for the report (None stays None)"""
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _rss_kb(pid: int) -> int:
+    """Resident set size of a process in kB (Linux only; 0 elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def start_server(args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "LLM_PROVIDER": "stub",
+        "STT_ENGINE": "stub",
+        "LLM_STUB_LATENCY_MS": str(args.latency_ms),
+        "LLM_STUB_JITTER_MS": str(args.jitter_ms),
+        "MONGO_URL": args.mongo_url or "mongomock://",
+        "DB_NAME": env.get("BENCH_DB_NAME", "benchmark"),
+        "LLM_MAX_CONCURRENCY": str(max(args.concurrency)),
+    })
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30, interval: float = 0.2) -> httpx.Response:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = await client.get("/api/health/ready")
+            if response.status_code == 200:
+                return response
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(interval)
+    raise RuntimeError("Server did not become ready")
+
+
+async def measure_cold_start(args, runs: int):
+    """Start ``runs`` fresh servers; time each from spawn to ready, with the server's phase timings"""
+    ready, phases = [], {}
+    for run in range(runs):
+        args.port = _free_port()
+        started = time.perf_counter()
+        server = start_server(args)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=5) as client:
+                response = await wait_ready(client, interval=0.01)
+            ready.append(time.perf_counter() - started)
+            for phase, seconds in response.json().get("startup_seconds", {}).items():
+                phases.setdefault(phase, []).append(seconds)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+        print(f"{'cold start':>20} run {run + 1:<3} ready in {ready[-1] * 1000:8.1f} ms")
+    result = {
+        "runs": runs,
+        "ready_ms_median": _ms(statistics.median(ready)),
+        "ready_ms_max": _ms(max(ready)),
+        "phases_ms_median": {phase: _ms(statistics.median(values)) for phase, values in phases.items()},
+    }
+    print(f"{'cold start':>20} median {result['ready_ms_median']} ms  phases {result['phases_ms_median']}")
+    return result
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_level(client, endpoint, concurrency, total, pid):
+    method, path, body = ENDPOINTS[endpoint]
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+    run = f"{uuid.uuid4().hex[:8]}-c{concurrency}"
+    rss_before = _rss_kb(pid) if pid else 0
+    peak_rss = rss_before
+
+    async def worker():
+        nonlocal errors, peak_rss
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body(i, run) if body else None)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+            if pid and i % 10 == 0:
+                peak_rss = max(peak_rss, _rss_kb(pid))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "throughput_rps": round(total / elapsed, 2),
+        "mean_ms": _ms(statistics.fmean(latencies)),
+        "p50_ms": _ms(_percentile(latencies, 0.50)),
+        "p95_ms": _ms(_percentile(latencies, 0.95)),
+        "p99_ms": _ms(_percentile(latencies, 0.99)),
+        "max_ms": _ms(latencies[-1]),
+        "rss_kb_before": rss_before,
+        "rss_kb_peak": max(peak_rss, _rss_kb(pid) if pid else 0),
+    }
+
+
+async def run_benchmark(args, base_url, pid):
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        await wait_ready(client)
+        for endpoint in args.endpoints:
+            results[endpoint] = {}
+            for concurrency in args.concurrency:
+                # Scale request count with concurrency so every level runs a few rounds
+                total = max(args.requests, concurrency * 4)
+                level = await run_level(client, endpoint, concurrency, total, pid)
+                results[endpoint][str(concurrency)] = level
+                print(
+                    f"{endpoint:>20} c={concurrency:<4} {level['throughput_rps']:>9.1f} req/s  "
+                    f"p50 {level['p50_ms']:>8} ms  p95 {level['p95_ms']:>8} ms  p99 {level['p99_ms']:>8} ms  "
+                    f"errors {level['errors']}  rss {level['rss_kb_peak'] // 1024} MB"
+                )
+    return results
+
+
+def compare(baseline, results, tolerance):
+    """List of human-readable regressions against a saved baseline"""
+    regressions = []
+    for endpoint, levels in results.items():
+        for concurrency, current in levels.items():
+            previous = baseline.get("results", {}).get(endpoint, {}).get(concurrency)
+            if not previous:
+                continue
+            label = f"{endpoint} c={concurrency}"
+            if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{label}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+            if current["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{label}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+            if current["errors"] > previous["errors"]:
+                regressions.append(f"{label}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def compare_cold_start(baseline, cold_start, tolerance):
+    previous = baseline.get("cold_start")
+    if not previous or not cold_start:
+        return []
+    if cold_start["ready_ms_median"] > previous["ready_ms_median"] * (1 + tolerance):
+        return [f"cold start: ready {previous['ready_ms_median']} -> {cold_start['ready_ms_median']} ms"]
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--port", type=int, default=0, help="port for the started server (default: any free)")
+    parser.add_argument("--mongo-url", help="real MongoDB for the started server (default: in-memory mock)")
+    parser.add_argument("--latency-ms", type=float, default=800, help="stub LLM latency")
+    parser.add_argument("--jitter-ms", type=float, default=200, help="stub LLM latency jitter (+/-)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=100, help="minimum requests per level")
+    parser.add_argument("--endpoints", nargs="+", default=list(ENDPOINTS), choices=list(ENDPOINTS))
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="fail if results regress against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--cold-start", type=int, default=0, metavar="N", help="also time N fresh server startups")
+    parser.add_argument("--cold-start-only", action="store_true", help="skip the load sweeps")
+    args = parser.parse_args(argv)
+
+    cold_start = None
+    if args.cold_start or args.cold_start_only:
+        if args.base_url:
+            parser.error("--cold-start needs to start its own servers (no --base-url)")
+        port = args.port
+        cold_start = asyncio.run(measure_cold_start(args, args.cold_start or 5))
+        args.port = port
+
+    results = {}
+    if not args.cold_start_only:
+        server = None
+        if args.base_url:
+            base_url, pid = args.base_url, None
+        else:
+            args.port = args.port or _free_port()
+            server = start_server(args)
+            base_url, pid = f"http://127.0.0.1:{args.port}", server.pid
+
+        try:
+            results = asyncio.run(run_benchmark(args, base_url, pid))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+    report = {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "config": {
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "mongo": "external" if args.mongo_url else "mock",
+            "base_url": args.base_url,
+        },
+        "results": results,
+        "cold_start": cold_start,
+    }
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2))
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(baseline, results, args.tolerance) + compare_cold_start(baseline, cold_start, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
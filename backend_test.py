@@ -1,7 +1,10 @@
 import requests
 import sys
 import json
+import threading
+import time
 from datetime import datetime
+from websockets.sync.client import connect
 
 class SalesTrainingAPITester:
     def __init__(self, base_url="https://salesgenie-3.preview.emergentagent.com"):
@@ -56,6 +59,14 @@ class SalesTrainingAPITester:
         """Test the root API endpoint"""
         return self.run_test("Root API Endpoint", "GET", "", 200)
 
+    def test_health_endpoints(self):
+        """Test liveness and readiness probes"""
+        success, _ = self.run_test("Liveness", "GET", "health/live", 200)
+        success2, response = self.run_test("Readiness", "GET", "health/ready", 200)
+        if success2 and isinstance(response, dict):
+            print(f"   Checks: {response.get('checks')}, startup: {response.get('startup_seconds')}")
+        return success and success2, response
+
     def test_get_all_scenarios(self):
         """Test getting all 60 scenarios"""
         success, response = self.run_test("Get All Scenarios", "GET", "scenarios", 200)
@@ -79,6 +90,19 @@ class SalesTrainingAPITester:
             print(f"   ✅ Found {len(categories)} categories: {categories[:3]}...")
         return success, response
 
+    def test_scenario_pagination(self):
+        """Test category filtering, pagination and ETag revalidation of scenarios"""
+        success, response = self.run_test("Get Scenarios (Paginated)", "GET", "scenarios?category=Value%20%26%20ROI%20Objections&skip=0&limit=3", 200)
+        if success and isinstance(response, list):
+            if len(response) == 3 and all(s['category'] == 'Value & ROI Objections' for s in response):
+                print(f"   ✅ Filtered page of {len(response)} scenarios")
+            else:
+                print(f"   ⚠️  Unexpected page contents")
+        
+        etag = requests.get(f"{self.api_url}/scenarios", timeout=30).headers.get('ETag')
+        success2, _ = self.run_test("Get Scenarios (Not Modified)", "GET", "scenarios", 304, headers={'If-None-Match': etag})
+        return success and success2, response
+
     def test_get_practice_scenarios(self):
         """Test getting 10 random practice scenarios"""
         success, response = self.run_test("Get Practice Scenarios", "GET", "scenarios/practice", 200)
@@ -116,6 +140,10 @@ class SalesTrainingAPITester:
         if success and isinstance(response, dict):
             if 'response' in response:
                 print(f"   ✅ AI response generated without scenario (length: {len(response['response'])} chars)")
+            if response.get('scenario_used') and response['scenario_used']['id'] == 30:
+                print(f"   ✅ Free-text objection matched to scenario 30")
+            else:
+                print(f"   ⚠️  Expected free-text objection to match scenario 30")
         return success, response
 
     def test_practice_feedback(self):
@@ -129,12 +157,40 @@ class SalesTrainingAPITester:
         if success and isinstance(response, dict):
             if 'feedback' in response:
                 print(f"   ✅ Feedback generated (length: {len(response['feedback'])} chars)")
-                if 'score' in response and response['score']:
+                if response.get('score') is not None and 1 <= response['score'] <= 10:
                     print(f"   ✅ Score provided: {response['score']}/10")
+                else:
+                    print(f"   ⚠️  No valid score parsed from the model reply")
                 if 'suggestions' in response and response['suggestions']:
                     print(f"   ✅ {len(response['suggestions'])} suggestions provided")
         return success, response
 
+    def test_practice_history(self):
+        """Test that practice attempts are stored and summarized per agent"""
+        agent_id = f"tester-{datetime.now().strftime('%H%M%S')}"
+        test_data = {
+            "scenario_id": 5,
+            "user_response": "No hidden charges at all - here is the full pricing table, GST included.",
+            "response_type": "text",
+            "agent_id": agent_id
+        }
+        self.run_test("Practice Feedback (Agent)", "POST", "practice/feedback", 200, test_data)
+        time.sleep(2)  # attempts are written behind the request path
+        success, response = self.run_test("Agent Trends", "GET", f"agents/{agent_id}/trends", 200)
+        if success and isinstance(response, list):
+            if response and response[0].get('attempts', 0) >= 1:
+                print(f"   ✅ Attempt recorded (avg score {response[0]['avg_score']})")
+            else:
+                print(f"   ⚠️  No recorded attempts for {agent_id}")
+        success2, _ = self.run_test("Category Trends", "GET", "analytics/categories?period=week", 200)
+        success3, practice = self.run_test("Adaptive Practice Scenarios", "GET", f"scenarios/practice?agent_id={agent_id}", 200)
+        if success3 and isinstance(practice, list):
+            if len(practice) == 10 and 5 not in [s['id'] for s in practice]:
+                print(f"   ✅ Just-practiced scenario held back from the next practice set")
+            else:
+                print(f"   ⚠️  Expected 10 scenarios without the one just practiced")
+        return success and success2 and success3, response
+
     def test_multilingual_support(self):
         """Test multilingual objection handling"""
         test_data = {
@@ -146,6 +202,250 @@ class SalesTrainingAPITester:
             print(f"   ✅ Hindi objection processed successfully")
         return success, response
 
+    def test_streaming_endpoints(self):
+        """Test the server-sent events variants of objection and feedback"""
+        test_data = {
+            "objection_text": "Let me think about it.",
+            "language": "English",
+            "scenario_id": 36
+        }
+        success, response = self.run_test("Handle Objection (Stream)", "POST", "objection/handle/stream", 200, test_data)
+        if success and isinstance(response, str):
+            if "event: delta" in response and "event: done" in response:
+                print(f"   ✅ Objection streamed as delta events")
+            else:
+                print(f"   ⚠️  Stream missing delta/done events")
+        
+        test_data = {
+            "scenario_id": 36,
+            "user_response": "Totally fair. Usually people want to think about price or setup - which one is it for you?",
+            "response_type": "text"
+        }
+        success2, response2 = self.run_test("Practice Feedback (Stream)", "POST", "practice/feedback/stream", 200, test_data)
+        if success2 and isinstance(response2, str):
+            if "event: score" in response2 and "event: suggestions" in response2:
+                print(f"   ✅ Score and suggestions streamed as separate events")
+            else:
+                print(f"   ⚠️  Stream missing score/suggestions events")
+        return success and success2, response2
+
+    def test_voice_feedback(self):
+        """Test server-side transcription input handling (silence and non-WAV audio)"""
+        results = []
+        for name, body, content_type, expected_status in [
+            ("Voice Feedback (Silence)", bytes(32000), "audio/l16", 422),
+            ("Voice Feedback (Bad WAV)", b"not a wav file at all", "audio/wav", 400),
+        ]:
+            self.tests_run += 1
+            print(f"\n🔍 Testing {name}...")
+            # Sent in chunks, the way a recorder uploads
+            chunks = (body[i:i + 4096] for i in range(0, len(body), 4096))
+            response = requests.post(
+                f"{self.api_url}/practice/feedback/voice?scenario_id=1&sample_rate=16000",
+                data=chunks, headers={'Content-Type': content_type}, timeout=30
+            )
+            if response.status_code == expected_status:
+                self.tests_passed += 1
+                print(f"✅ Passed - Status: {response.status_code} ({response.json().get('detail')})")
+            else:
+                print(f"❌ Failed - Expected {expected_status}, got {response.status_code}")
+            results.append(response.status_code == expected_status)
+        return all(results), None
+
+    def test_voice_socket(self):
+        """Test the recording WebSocket: chunks while recording, then 'end' (silence gets a 422 error event)"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Voice Feedback (WebSocket)...")
+        url = self.api_url.replace("http", "ws", 1) + "/practice/feedback/voice/ws?scenario_id=1&sample_rate=16000"
+        try:
+            with connect(url, open_timeout=30) as socket:
+                for i in range(0, 32000, 4096):
+                    socket.send(bytes(32000)[i:i + 4096])
+                socket.send("end")
+                message = json.loads(socket.recv(timeout=30))
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False, None
+        if message["event"] == "error" and message["data"].get("status") == 422:
+            self.tests_passed += 1
+            print(f"✅ Passed - {message['data']['detail']}")
+            return True, message
+        print(f"❌ Failed - Expected a 422 error event, got {message}")
+        return False, message
+
+    def test_batch_objections(self):
+        """Test handling a deck of objections in one batch call"""
+        test_data = {
+            "items": [
+                {"objection_text": "Your commission is too high.", "language": "English", "scenario_id": 1},
+                {"objection_text": "Send me an email with the details.", "language": "English", "scenario_id": 31},
+                {"objection_text": "Mujhe technology samajh nahi aati.", "language": "Hindi", "scenario_id": 42}
+            ]
+        }
+        success, response = self.run_test("Handle Objection Batch", "POST", "objection/handle/batch", 200, test_data)
+        if success and isinstance(response, dict) and 'results' in response:
+            results = response['results']
+            if [r['index'] for r in results] == [0, 1, 2]:
+                print(f"   ✅ Results returned in request order")
+            failed = [r for r in results if r.get('error')]
+            if failed:
+                print(f"   ⚠️  {len(failed)} item(s) failed: {failed[0]['error']}")
+            else:
+                print(f"   ✅ All {len(results)} items answered")
+        return success, response
+
+    def test_job_queue(self):
+        """Test queued generations with long-polling"""
+        test_data = {"objection_text": "Your commission is too high.", "language": "English", "scenario_id": 1}
+        success, job = self.run_test("Queue Objection Job", "POST", "jobs/objection", 202, test_data)
+        if not success or not isinstance(job, dict):
+            return False, job
+        success2, job = self.run_test("Long-poll Job", "GET", f"jobs/{job['id']}?wait=25", 200)
+        if success2 and isinstance(job, dict):
+            if job.get('status') == 'succeeded' and job.get('result', {}).get('response'):
+                print(f"   ✅ Job finished after {job['attempts']} attempt(s)")
+            else:
+                print(f"   ⚠️  Job still {job.get('status')}: {job.get('error')}")
+        success3, _ = self.run_test("Unknown Job", "GET", "jobs/does-not-exist", 404)
+        return success and success2 and success3, job
+
+    def test_objection_cache(self):
+        """Test that a repeated objection is served from the response cache"""
+        test_data = {
+            "objection_text": "Your commission is too high.",
+            "language": "English",
+            "scenario_id": 1
+        }
+        self.run_test("Handle Objection (Warm Cache)", "POST", "objection/handle", 200, test_data)
+        success, response = self.run_test("Cache Stats", "GET", "cache/stats", 200)
+        if success and isinstance(response, dict):
+            if response.get('hits', 0) > 0:
+                print(f"   ✅ Cache hits recorded: {response['hits']} (hit rate {response['hit_rate']})")
+            else:
+                print(f"   ⚠️  No cache hits recorded")
+        return success, response
+
+    def test_paraphrase_cache(self):
+        """Test that paraphrases of one curated scenario share a single cache entry"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Paraphrase Cache Sharing...")
+        phrasings = ["Too expensive for me", "This is too costly for me", "Bahut mehenga hai yaar!"]
+        try:
+            before = requests.get(f"{self.api_url}/cache/stats", timeout=30).json()
+            responses = [
+                requests.post(
+                    f"{self.api_url}/objection/handle",
+                    json={"objection_text": text, "language": "Telugu"},
+                    timeout=30,
+                ).json()
+                for text in phrasings
+            ]
+            after = requests.get(f"{self.api_url}/cache/stats", timeout=30).json()
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False, None
+        scenario_ids = {(r.get("scenario_used") or {}).get("id") for r in responses}
+        hits = after["hits"] - before["hits"]
+        if len(scenario_ids) == 1 and None not in scenario_ids and hits >= len(phrasings) - 1:
+            self.tests_passed += 1
+            print(f"✅ Passed - all matched scenario {scenario_ids.pop()}, {hits} cache hit(s)")
+            return True, responses
+        print(f"❌ Failed - matched scenarios {scenario_ids}, {hits} cache hit(s) for {len(phrasings)} phrasings")
+        return False, responses
+
+    def test_scenario_import_export(self):
+        """Test streaming scenario export, a dry-run bulk import and serialized replace imports"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Scenario Export (CSV)...")
+        response = requests.get(f"{self.api_url}/scenarios/export?format=csv", stream=True, timeout=30)
+        lines = list(response.iter_lines(decode_unicode=True))
+        success = response.status_code == 200 and lines[:1] == ["id,category,objection,context,suggested_response"]
+        if success:
+            self.tests_passed += 1
+            print(f"✅ Passed - {len(lines) - 1} rows exported")
+        else:
+            print(f"❌ Failed - Status: {response.status_code}, header: {lines[:1]}")
+        
+        rows = [
+            {"id": 900001, "category": "Imported", "objection": "We already have a vendor.", "context": "Test row",
+             "suggested_response": "Ask what they would change about their current vendor."},
+            {"id": "not-a-number", "category": "Imported"},
+        ]
+        self.tests_run += 1
+        print(f"\n🔍 Testing Scenario Import (Dry Run)...")
+        response = requests.post(
+            f"{self.api_url}/scenarios/import?dry_run=true",
+            data="\n".join(json.dumps(row) for row in rows).encode("utf-8"),
+            headers={'Content-Type': 'application/x-ndjson'}, timeout=30
+        )
+        report = response.json() if response.status_code == 200 else {}
+        success2 = report.get('valid') == 1 and report.get('invalid') == 1
+        if success2:
+            self.tests_passed += 1
+            print(f"✅ Passed - invalid row reported: {report['errors'][0]}")
+        else:
+            print(f"❌ Failed - Status: {response.status_code}, report: {report}")
+        
+        # Replace the catalog with itself, slowly, and try a second replace meanwhile
+        catalog = requests.get(f"{self.api_url}/scenarios", timeout=30).json()
+        def slow_body():
+            for scenario in catalog:
+                time.sleep(0.02)
+                yield (json.dumps(scenario) + "\n").encode("utf-8")
+        first = {}
+        def replace():
+            first['response'] = requests.post(
+                f"{self.api_url}/scenarios/import?mode=replace&batch_size=10", data=slow_body(),
+                headers={'Content-Type': 'application/x-ndjson'}, timeout=30
+            )
+        self.tests_run += 1
+        print(f"\n🔍 Testing Concurrent Replace Imports...")
+        runner = threading.Thread(target=replace)
+        runner.start()
+        time.sleep(0.3)
+        second = requests.post(
+            f"{self.api_url}/scenarios/import?mode=replace",
+            data=json.dumps(rows[0]).encode("utf-8"),
+            headers={'Content-Type': 'application/x-ndjson'}, timeout=30
+        )
+        runner.join()
+        report3 = first['response'].json() if first['response'].status_code == 200 else {}
+        success3 = (
+            second.status_code == 409
+            and report3.get('seeded') == 0
+            and report3.get('inserted', 0) + report3.get('updated', 0) == len(catalog)
+            and report3.get('scenarios') == len(catalog)
+        )
+        if success3:
+            self.tests_passed += 1
+            print(f"✅ Passed - second replace rejected: {second.json()['detail']}")
+        else:
+            print(f"❌ Failed - second: {second.status_code}, first report: {report3}")
+        return success and success2 and success3, report
+
+    def test_model_routing(self):
+        """Test that each request class has a model route with live latency tracking"""
+        success, response = self.run_test("LLM Routing Stats", "GET", "llm/stats", 200)
+        if success and isinstance(response, dict):
+            routing = response.get('routing', {})
+            if {'objection', 'feedback'} <= set(routing.get('routes', {})):
+                print(f"   ✅ Routes: {routing['routes']}")
+                for model, latency in routing.get('models', {}).items():
+                    print(f"   {model}: EWMA {latency['ewma_seconds']}s, p95 {latency['p95_seconds']}s")
+            else:
+                print(f"   ⚠️  Missing model routes")
+        return success, response
+
+    def test_metrics(self):
+        """Test the Prometheus metrics endpoint"""
+        success, response = self.run_test("Metrics", "GET", "metrics", 200)
+        if success and isinstance(response, str):
+            if "http_request_duration_seconds_bucket" in response:
+                print(f"   ✅ Request latency histograms exported")
+            else:
+                print(f"   ⚠️  No latency histograms in metrics output")
+        return success, response
+
     def test_error_handling(self):
         """Test error handling with invalid data"""
         # Test empty objection
@@ -174,20 +474,35 @@ def main():
     # Run all tests
     print("\n📋 Testing Basic Endpoints...")
     tester.test_root_endpoint()
+    tester.test_health_endpoints()
     
     print("\n📋 Testing Scenario Endpoints...")
     tester.test_get_all_scenarios()
     tester.test_get_categories()
+    tester.test_scenario_pagination()
     tester.test_get_practice_scenarios()
+    tester.test_scenario_import_export()
     
     print("\n🤖 Testing AI Integration...")
     tester.test_handle_objection()
     tester.test_handle_objection_without_scenario()
     tester.test_practice_feedback()
+    tester.test_practice_history()
+    tester.test_objection_cache()
+    tester.test_paraphrase_cache()
+    tester.test_batch_objections()
+    tester.test_voice_feedback()
+    tester.test_voice_socket()
+    tester.test_job_queue()
+    tester.test_streaming_endpoints()
     
     print("\n🌍 Testing Multilingual Support...")
     tester.test_multilingual_support()
     
+    print("\n📈 Testing Metrics...")
+    tester.test_metrics()
+    tester.test_model_routing()
+    
     print("\n⚠️  Testing Error Handling...")
     tester.test_error_handling()
     
@@ -14,6 +14,124 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// Stable per-browser id so practice history and trends can be tracked per agent
+const getAgentId = () => {
+  let agentId = localStorage.getItem('agentId');
+  if (!agentId) {
+    agentId = `agent-${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 8)}`;
+    localStorage.setItem('agentId', agentId);
+  }
+  return agentId;
+};
+
+// POST to a server-sent events endpoint and call onEvent(name, data) per event
+const streamEvents = async (url, body, onEvent, contentType = 'application/json') => {
+  const response = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': contentType },
+    body: contentType === 'application/json' ? JSON.stringify(body) : body
+  });
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || `Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const raw of events) {
+      let name = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) name = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) continue; // keep-alive comment
+      const payload = JSON.parse(data);
+      if (name === 'error') throw new Error(payload.detail);
+      onEvent(name, payload);
+    }
+  }
+};
+
+// Record the microphone as 16-bit PCM for server-side transcription; onChunk gets each buffer as it is recorded
+const startPcmRecorder = async (onChunk) => {
+  const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+  const context = new (window.AudioContext || window.webkitAudioContext)();
+  const source = context.createMediaStreamSource(stream);
+  const processor = context.createScriptProcessor(4096, 1, 1);
+  const chunks = [];
+  processor.onaudioprocess = (event) => {
+    const input = event.inputBuffer.getChannelData(0);
+    const pcm = new Int16Array(input.length);
+    for (let i = 0; i < input.length; i++) {
+      pcm[i] = Math.max(-1, Math.min(1, input[i])) * 0x7fff;
+    }
+    chunks.push(pcm);
+    onChunk(pcm.buffer);
+  };
+  source.connect(processor);
+  processor.connect(context.destination);
+  return {
+    sampleRate: context.sampleRate,
+    stop: () => {
+      processor.disconnect();
+      source.disconnect();
+      stream.getTracks().forEach((track) => track.stop());
+      context.close();
+      return new Blob(chunks, { type: 'audio/l16' });
+    }
+  };
+};
+
+// Send a recording to the server while it is being made, so utterances are transcribed as the agent speaks.
+// Events arrive as { event, data } messages; finish() resolves after 'done'. If the socket never opens
+// (e.g. a proxy without WebSocket support), finish() rejects with error.beforeOpen set.
+const openVoiceSocket = (params, onEvent) => {
+  const socket = new WebSocket(`${API.replace(/^http/, 'ws')}/practice/feedback/voice/ws?${params}`);
+  const queued = [];
+  let opened = false;
+  const finished = new Promise((resolve, reject) => {
+    socket.onopen = () => {
+      opened = true;
+      queued.splice(0).forEach((message) => socket.send(message));
+    };
+    socket.onmessage = (message) => {
+      const { event, data } = JSON.parse(message.data);
+      if (event === 'error') {
+        reject(new Error(data.detail));
+        return;
+      }
+      onEvent(event, data);
+      if (event === 'done') resolve();
+    };
+    socket.onclose = () => {
+      const error = new Error('Voice connection closed before feedback arrived');
+      error.beforeOpen = !opened;
+      reject(error);
+    };
+  });
+  finished.catch(() => {}); // awaited in finish(); don't report it as unhandled while still recording
+  const send = (message) => {
+    if (socket.readyState === WebSocket.OPEN) socket.send(message);
+    else if (socket.readyState === WebSocket.CONNECTING) queued.push(message);
+  };
+  return {
+    send,
+    finish: () => {
+      send('end');
+      return finished;
+    },
+    close: () => socket.close()
+  };
+};
+
 function App() {
   const [currentMode, setCurrentMode] = useState('home');
   const [scenarios, setScenarios] = useState([]);
@@ -33,6 +151,7 @@ function App() {
 
   const recognitionRef = useRef(null);
   const practiceRecognitionRef = useRef(null);
+  const pcmRecorderRef = useRef(null);
 
   const languages = [
     'English', 'Hindi', 'Hinglish', 'Marathi', 'Kannada', 'Tamil', 'Telugu', 'Bangla'
@@ -64,7 +183,7 @@ function App() {
 
   const fetchPracticeScenarios = async () => {
     try {
-      const response = await axios.get(`${API}/scenarios/practice`);
+      const response = await axios.get(`${API}/scenarios/practice`, { params: { agent_id: getAgentId() } });
       setPracticeScenarios(response.data);
       setCurrentPracticeIndex(0);
     } catch (error) {
@@ -117,9 +236,25 @@ function App() {
     setIsRecording(false);
   };
 
-  const startPracticeRecording = () => {
-    if (!('webkitSpeechRecognition' in window) && !('SpeechRecognition' in window)) {
-      toast.error('Speech recognition not supported in this browser');
+  const startPracticeRecording = async () => {
+    // Browser recognition is missing on many devices and only reliable for English
+    if ((!('webkitSpeechRecognition' in window) && !('SpeechRecognition' in window)) || selectedLanguage !== 'English') {
+      if (!practiceScenarios[currentPracticeIndex]) {
+        toast.error('No scenario selected');
+        return;
+      }
+      try {
+        setPracticeFeedback(null);
+        let socket = null;
+        const recorder = await startPcmRecorder((chunk) => socket && socket.send(chunk));
+        socket = openVoiceSocket(voiceParams(recorder.sampleRate), handleFeedbackEvent);
+        recorder.socket = socket;
+        pcmRecorderRef.current = recorder;
+        setPracticeIsRecording(true);
+        toast.success('Recording started...');
+      } catch (error) {
+        toast.error('Microphone unavailable: ' + error.message);
+      }
       return;
     }
 
@@ -156,6 +291,13 @@ function App() {
   };
 
   const stopPracticeRecording = () => {
+    if (pcmRecorderRef.current) {
+      const recorder = pcmRecorderRef.current;
+      pcmRecorderRef.current = null;
+      setPracticeIsRecording(false);
+      handleVoiceFeedback(recorder);
+      return;
+    }
     if (practiceRecognitionRef.current) {
       practiceRecognitionRef.current.stop();
     }
@@ -185,15 +327,68 @@ function App() {
     setLoading(true);
     setAiResponse(''); // Clear previous response
     try {
-      const response = await axios.post(`${API}/objection/handle`, {
+      await streamEvents(`${API}/objection/handle/stream`, {
         objection_text: objectionText.trim(),
         language: selectedLanguage,
         scenario_id: scenarioId
+      }, (event, data) => {
+        if (event === 'delta') {
+          setLoading(false);
+          setAiResponse((previous) => previous + data.text);
+        } else if (event === 'done') {
+          setAiResponse(data.response);
+        }
       });
-      setAiResponse(response.data.response);
       toast.success('AI response generated!');
     } catch (error) {
-      toast.error('Failed to get AI response: ' + (error.response?.data?.detail || error.message));
+      toast.error('Failed to get AI response: ' + error.message);
+      console.error(error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const handleFeedbackEvent = (event, data) => {
+    if (event === 'transcript') {
+      setPracticeRecordedText(data.text);
+      setPracticeResponse(data.text);
+    } else if (event === 'delta') {
+      setLoading(false);
+      setPracticeFeedback((previous) => ({
+        feedback: (previous?.feedback || '') + data.text,
+        score: previous?.score ?? null,
+        suggestions: previous?.suggestions || []
+      }));
+    } else if (event === 'score' || event === 'suggestions') {
+      setPracticeFeedback((previous) => ({ ...previous, ...data }));
+    } else if (event === 'done') {
+      setPracticeFeedback(data);
+    }
+  };
+
+  const voiceParams = (sampleRate) => new URLSearchParams({
+    scenario_id: practiceScenarios[currentPracticeIndex].id,
+    language: selectedLanguage,
+    agent_id: getAgentId(),
+    sample_rate: Math.round(sampleRate)
+  });
+
+  // Wait for feedback on a recording streamed while it was made; upload it in one go if the socket never connected
+  const handleVoiceFeedback = async (recorder) => {
+    const audio = recorder.stop();
+    setLoading(true);
+    try {
+      try {
+        await recorder.socket.finish();
+      } catch (error) {
+        if (!error.beforeOpen) throw error;
+        await streamEvents(
+          `${API}/practice/feedback/voice?${voiceParams(recorder.sampleRate)}`, audio, handleFeedbackEvent, 'audio/l16'
+        );
+      }
+      toast.success('Feedback received!');
+    } catch (error) {
+      toast.error('Failed to get feedback: ' + error.message);
       console.error(error);
     } finally {
       setLoading(false);
@@ -215,13 +410,12 @@ function App() {
     setPracticeFeedback(null); // Clear previous feedback
     
     try {
-      const response = await axios.post(`${API}/practice/feedback`, {
+      await streamEvents(`${API}/practice/feedback/stream`, {
         scenario_id: practiceScenarios[currentPracticeIndex].id,
         user_response: practiceResponse.trim(),
-        response_type: 'text'
-      });
-      console.log('Practice feedback response:', response.data);
-      setPracticeFeedback(response.data);
+        response_type: 'text',
+        agent_id: getAgentId()
+      }, handleFeedbackEvent);
       toast.success('Feedback received!');
       
       // Scroll to feedback section after a short delay
@@ -233,7 +427,7 @@ function App() {
       }, 500);
       
     } catch (error) {
-      toast.error('Failed to get feedback: ' + (error.response?.data?.detail || error.message));
+      toast.error('Failed to get feedback: ' + error.message);
       console.error(error);
     } finally {
       setLoading(false);